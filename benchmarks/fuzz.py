@@ -0,0 +1,286 @@
+"""
+Search for Wikkly inputs that are expensive to lex and parse.
+
+Starting from examples/every_markup.wikkly and a grammar of the
+constructs in lextokens.tokens, inputs are grown and mutated at random.
+Each is run through WikklyParser with a NullCompiler and timed. The
+slowest inputs by time per byte are kept as a corpus and are the
+preferred parents for the next mutations. For each of them the token
+type whose lexing or parsing took longest is reported.
+
+    python benchmarks/fuzz.py [-n rounds] [-o corpus_dir] [--seed n]
+
+The corpus directory receives one .wikkly file per kept input and a
+report.json.
+"""
+import sys, time, random, argparse, pathlib, json, collections
+
+from tinymarkup.exceptions import MarkupError
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from wikklytext import lextokens
+from wikklytext.parser import WikklyParser
+from wikklytext.compiler import NullCompiler
+from wikklytext.macro import WikklyMacro
+from wikklytext.budget import RenderBudget
+
+examples = pathlib.Path(__file__).parent.parent / "examples"
+
+# Snippets for each token type, including broken ones (unterminated,
+# mis-nested) because those tend to be the expensive ones.
+grammar = {
+    "BOLD": [ "''", "''bold''", ],
+    "ITALIC": [ "//", "//italic//", ],
+    "STRIKETHROUGH": [ "--", "--strike--", ],
+    "UNDERLINE": [ "__", "__under__", ],
+    "SUPERSCRIPT": [ "^^", "^^sup^^", ],
+    "SUBSCRIPT": [ "~~", "~~sub~~", ],
+    "SEPARATOR": [ "\n----\n", ],
+    "LISTITEM": [ "\n* item", "\n# item", "\n## item", "\n•", ],
+    "HEADING": [ "\n! Heading\n", "\n!!! ", ],
+    "D_TERM": [ "\n; term", ],
+    "D_DEFINITION": [ "\n: definition", ],
+    "MACRO": [ "<<m>>", "<<m 'a' \"b\" c=d>>", "<<m '''a\nb'''>>",
+               "<<m '", "<<m \"\"\"", "<<m", ],
+    "START_TAG_MACRO_START": [ "@@m: ", "@@m('a'): ", "@@m(", ],
+    "START_TAG_MACRO_END": [ "@@", ],
+    "BLOCKQUOTE_START": [ "\n<<< ", "\n<<<m: ", ],
+    "BLOCKQUOTE_END": [ ">>>\n", ],
+    "LINK_AB": [ "[[a|b]]", "[[a|", "[[a|b", ],
+    "LINK_A": [ "[[a]]", "[[", "]]", ],
+    "INLINE_BLOCK_START": [ "{{m{", ],
+    "INLINE_BLOCK_END": [ "}}}", ],
+    "CODE_BLOCK": [ "\n{{{\ncode // -- ''\n}}}\n", "\n//{{{\nx\n//}}}\n",
+                    "\n{{{\n", ],
+    "CODE_INLINE": [ "{{{a // b}}}", "{{{", ],
+    "RAW_HTML": [ "<html><b>x</b></html>", "<html>", "</html>", ],
+    "NOWIKI": [ '"""\'\'x\'\'"""', '"""', "<nowiki>[[a]]</nowiki>", ],
+    "C_COMMENT": [ "\n/***\n", "\n/***\nx\n***/\n", ],
+    "HTML_COMMENT": [ "\n<!---\n", "\n<!---\nx\n--->\n", ],
+    "HTML_COMMENT_END": [ "\n--->\n", ],
+    "TABLEROW_START": [ "\n| a | b |", "\n|! h |", "\n|", ],
+    "TABLEROW_END": [ "|\n", ],
+    "TABLE_END": [ "|\n\n", ],
+    "TABLE_CAPTION": [ "\n|caption|c\n", "\n|m: caption|c\n", ],
+    "EOLS": [ "\n", "\n\n", "\n  \n \t\n", ],
+    "CATCH_URL": [ "http://example.com/a?b=c", "mailto:a@b.de", ],
+    "COMMENT": [ "/% c %/", "/%", "%/", "   /% c %/   ", ],
+    "HTML_BREAK": [ "<br>", "< br />\n", ],
+    "PIPECHAR": [ "|", ],
+    "NULLDOT": [ "\n.\n", ],
+    "WORD": [ "word", "Wörter", ],
+    "OTHER_CHARACTERS": [ " ", "    ", "\t", ",", "(", "'", "/", "%", ],
+}
+
+missing = set(lextokens.tokens) - set(grammar)
+if missing:
+    print("No grammar for token types:", ", ".join(sorted(missing)),
+          file=sys.stderr)
+
+class NullMacro(WikklyMacro):
+    environments = { "block", "inline", }
+
+    def tag_params(self, *args, **kw):
+        return {}
+
+class AnyMacroLibrary(MacroLibrary):
+    """
+    Resolve every macro name to NullMacro so random macro calls do
+    not stop the parser.
+    """
+    def get(self, name, location=None):
+        return NullMacro
+
+class TimedRun(object):
+    """
+    Parse a source with a NullCompiler and attribute the time spent to
+    token types: the time the lexer took to produce a token and the
+    time the parser took handling it.
+    """
+    def __init__(self, source:str, context:Context, max_seconds:float):
+        self.source = source
+        self.lex_time = collections.Counter()
+        self.parse_time = collections.Counter()
+        self.error = None
+
+        parser = WikklyParser(RenderBudget(max_seconds=max_seconds))
+        compiler = NullCompiler(context)
+
+        base = parser.lexer.base
+        base_token = base.token
+        last = [ None, None ] # type of the last token, when it was returned
+
+        def token():
+            now = time.perf_counter()
+            if last[0] is not None:
+                self.parse_time[last[0]] += now - last[1]
+
+            tok = base_token()
+
+            then = time.perf_counter()
+            if tok is None:
+                last[0] = None
+            else:
+                self.lex_time[tok.type] += then - now
+                last[0] = tok.type
+            last[1] = then
+            return tok
+
+        base.token = token
+
+        start = time.perf_counter()
+        try:
+            compiler.compile(parser, source)
+        except MarkupError as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+        except Exception as exc:
+            # Errors other than MarkupErrors are bugs and worth keeping.
+            self.error = f"BUG {type(exc).__name__}: {exc}"
+        self.elapsed = time.perf_counter() - start
+
+        if last[0] is not None:
+            self.parse_time[last[0]] += time.perf_counter() - last[1]
+
+    @property
+    def per_byte(self):
+        return self.elapsed / max(len(self.source), 1)
+
+    def culprit(self):
+        """
+        Return a description of the lexer rule or parser branch that
+        took the most time.
+        """
+        candidates = []
+        for type, t in self.lex_time.items():
+            candidates.append( (t, f"lexing {type}",) )
+        for type, t in self.parse_time.items():
+            candidates.append( (t, f"parsing {type}",) )
+
+        if not candidates:
+            return "nothing"
+
+        t, what = max(candidates)
+        return "%s (%i%%)" % ( what, t / max(self.elapsed, 1e-9) * 100, )
+
+class Fuzzer(object):
+    def __init__(self, rng:random.Random, min_size:int, max_size:int,
+                 corpus_size:int, max_seconds:float):
+        self.rng = rng
+        self.min_size = min_size
+        self.max_size = max_size
+        self.corpus_size = corpus_size
+        self.max_seconds = max_seconds
+        self.context = Context(AnyMacroLibrary())
+
+        seed = (examples / "every_markup.wikkly").read_text()
+        self.seeds = [ seed, ] + [ paragraph + "\n\n"
+                                   for paragraph in seed.split("\n\n") ]
+        self.corpus = [] # List of TimedRun, slowest first.
+
+    def snippet(self):
+        return self.rng.choice(self.rng.choice(list(grammar.values())))
+
+    def mutate(self, source:str) -> str:
+        rng = self.rng
+        position = rng.randint(0, len(source))
+        mutation = rng.randrange(7)
+
+        if mutation == 0: # Insert a construct.
+            return source[:position] + self.snippet() + source[position:]
+        elif mutation == 1: # Insert a construct many times.
+            repeated = self.snippet() * rng.choice([ 8, 64, 512, ])
+            return source[:position] + repeated + source[position:]
+        elif mutation == 2: # Duplicate a slice.
+            end = rng.randint(position, len(source))
+            return source[:end] + source[position:end] + source[end:]
+        elif mutation == 3: # Delete a slice.
+            end = rng.randint(position, min(len(source), position + 64))
+            return source[:position] + source[end:]
+        elif mutation == 4: # Truncate, leaving constructs unterminated.
+            return source[:position]
+        elif mutation == 5: # Double the whole input.
+            return source + source
+        else: # Splice with another input.
+            other = self.parent()
+            return source[:position] + other[rng.randint(0, len(other)):]
+
+    def parent(self) -> str:
+        if self.corpus and self.rng.random() < 0.8:
+            # Prefer the slow ones.
+            index = int(self.rng.random() ** 2 * len(self.corpus))
+            return self.corpus[index].source
+        else:
+            return self.rng.choice(self.seeds)
+
+    def step(self):
+        source = self.parent()
+        for a in range(self.rng.randint(1, 4)):
+            source = self.mutate(source)
+
+        # Small inputs are dominated by the parser’s fixed overhead.
+        # Grow them by repetition.
+        while len(source) < self.min_size:
+            source = source + (source or self.snippet())
+        source = source[:self.max_size]
+
+        run = TimedRun(source, self.context, self.max_seconds)
+
+        self.corpus.append(run)
+        self.corpus.sort(key=lambda run: run.per_byte, reverse=True)
+        del self.corpus[self.corpus_size:]
+
+        return run
+
+    def save(self, directory:pathlib.Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        for path in directory.glob("*.wikkly"):
+            path.unlink()
+
+        report = []
+        for counter, run in enumerate(self.corpus):
+            filename = "%03i.wikkly" % counter
+            (directory / filename).write_text(run.source)
+            report.append({ "file": filename,
+                            "bytes": len(run.source),
+                            "seconds": run.elapsed,
+                            "us_per_byte": run.per_byte * 1e6,
+                            "culprit": run.culprit(),
+                            "error": run.error, })
+
+        with (directory / "report.json").open("w") as fp:
+            json.dump(report, fp, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--rounds", type=int, default=1000)
+    parser.add_argument("-o", "--corpus", type=pathlib.Path,
+                        default=pathlib.Path("fuzz-corpus"))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--min-size", type=int, default=4*1024)
+    parser.add_argument("--max-size", type=int, default=64*1024)
+    parser.add_argument("--keep", type=int, default=20,
+                        help="Number of slowest inputs to keep.")
+    parser.add_argument("--max-seconds", type=float, default=10.0,
+                        help="Render budget per input.")
+    args = parser.parse_args()
+
+    fuzzer = Fuzzer(random.Random(args.seed), args.min_size, args.max_size,
+                    args.keep, args.max_seconds)
+
+    for round in range(args.rounds):
+        run = fuzzer.step()
+        if run is fuzzer.corpus[0]:
+            print("%6i %8i bytes %8.2fµs/byte  %s" % (
+                round, len(run.source), run.per_byte * 1e6, run.culprit()))
+
+    fuzzer.save(args.corpus)
+
+    print()
+    print("Slowest inputs:")
+    for run in fuzzer.corpus[:10]:
+        print("%8i bytes %8.2fµs/byte  %s%s" % (
+            len(run.source), run.per_byte * 1e6, run.culprit(),
+            "  " + run.error if run.error else ""))
+
+main()
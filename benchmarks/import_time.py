@@ -0,0 +1,63 @@
+"""
+Measure what importing wikklytext costs with `python -X importtime`
+and check that the cheap imports stay cheap: `import wikklytext` and
+`import wikklytext.macro` must not build the lexer, load a backend or
+pull in debugging tools. Exits with status 1 if they do.
+
+    python benchmarks/import_time.py
+"""
+import sys, subprocess
+
+# Statements to time and modules each of them must not import.
+imports = {
+    "import wikklytext": { "ply", "icecream", "tinymarkup.cmdline",
+                           "wikklytext.parser", "wikklytext.to_html",
+                           "wikklytext.to_tsearch", },
+    "import wikklytext.macro": { "ply", "icecream", "tinymarkup.cmdline",
+                                 "wikklytext.parser", "wikklytext.to_html",
+                                 "wikklytext.to_tsearch", },
+    "import wikklytext.to_html": { "icecream", "tinymarkup.cmdline", },
+    "import wikklytext.to_tsearch": { "icecream", "tinymarkup.cmdline", },
+}
+
+def import_times(statement):
+    """
+    Run `statement` in a fresh interpreter and return a dict mapping
+    the names of the modules it imported to their cumulative import
+    time in microseconds.
+    """
+    result = subprocess.run([ sys.executable, "-X", "importtime",
+                              "-c", statement, ],
+                            capture_output=True, text=True, check=True)
+    ret = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue # The header line.
+        ret[parts[2].strip()] = cumulative
+    return ret
+
+def main():
+    failed = []
+    for statement, forbidden in imports.items():
+        times = import_times(statement)
+        module = statement.split()[-1]
+        print("%-32s %8.1f ms  %4i modules" % (
+            statement, times.get(module, 0) / 1000, len(times)))
+
+        imported = forbidden & set(times.keys())
+        if imported:
+            failed.append(f"{statement}: {', '.join(sorted(imported))}")
+
+    if failed:
+        print("Imported eagerly:", file=sys.stderr)
+        for line in failed:
+            print("  " + line, file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,78 @@
+"""
+Lex pathological inputs of growing size and check that the time spent
+grows roughly linearly with the input. Exits with status 1 if any of
+them does not.
+
+    python benchmarks/lexer_scaling.py
+"""
+import sys, time
+
+from wikklytext.parser import wikkly_base_lexer
+
+# Each of these is repeated to build inputs of growing size.
+pathological = {
+    "whitespace run": lambda n: "a" + " " * n + "b\n",
+    "unclosed comments": lambda n: "/% " * (n // 3),
+    "comment after spaces": lambda n: ("x" + " " * 64 + "/% c %/ ") * (n // 80),
+    "unclosed links": lambda n: "[[a|" * (n // 4),
+    "table rows": lambda n: "| a | b |\n" * (n // 10),
+    "macro calls": lambda n: "<<m 'a' b=c>>\n" * (n // 14),
+    "macros in long lines": lambda n: ("x" * 200 + " <<m>>\n") * (n // 207),
+    "start tag macros": lambda n: "@@m('a'): x@@\n" * (n // 14),
+    "unclosed code blocks": lambda n: "{{{\n" * (n // 4),
+    "unclosed raw html": lambda n: "<html>" * (n // 6),
+    "unclosed nowiki": lambda n: 'a"""' * (n // 4),
+    "unclosed comment regions": lambda n: "<!---\nx\n" * (n // 8),
+    "comment regions": lambda n: "/***\nx ''y''\n***/\n" * (n // 17),
+    "false code block ends": lambda n: "{{{\n" * (n // 9)
+                                       + "\n}}}x" * (n // 9),
+    "false comment ends": lambda n: "/***\n" * (n // 11)
+                                    + "\n***/x" * (n // 11),
+    "false html comment ends": lambda n: "<!---\n" * (n // 13)
+                                         + "\n--->x" * (n // 13),
+}
+
+# Time per byte for the largest input may be this many times that of
+# the smallest one.
+tolerance = 3.0
+
+def lex(source):
+    lexer = wikkly_base_lexer.clone()
+    lexer.input(source)
+    while lexer.token() is not None:
+        pass
+
+def time_lex(source, repeat=3):
+    best = None
+    for a in range(repeat):
+        t = time.perf_counter()
+        lex(source)
+        elapsed = time.perf_counter() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    sizes = [ 8 * 1024, 32 * 1024, 128 * 1024, ]
+
+    failed = []
+    for name, make in pathological.items():
+        per_byte = []
+        for size in sizes:
+            source = make(size)
+            per_byte.append(time_lex(source) / len(source))
+
+        ratio = per_byte[-1] / per_byte[0]
+        print("%-24s %s  ratio %5.2f" % (
+            name,
+            " ".join([ "%8.3fµs/kB" % (t * 1e6 * 1024,) for t in per_byte ]),
+            ratio,))
+
+        if ratio > tolerance:
+            failed.append(name)
+
+    if failed:
+        print("Worse than linear:", ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,94 @@
+"""
+Measure the memory used to render each document of the synthetic
+benchmark corpus with tracemalloc: the peak while rendering and what
+is still allocated after the render returned, both per kB of input.
+
+Retained memory must return to the baseline after to_html() returns and
+after a long-lived parser and compiler have been used. Exits with status
+1 if it does not.
+
+    python benchmarks/memory.py [--size bytes]
+"""
+import sys, io, gc, argparse, tracemalloc
+
+from wikklytext.parser import WikklyParser
+from wikklytext.to_html import to_html, HTMLCompiler
+from wikklytext.benchmark import corpus, generate_document, benchmark_context
+
+# Memory still allocated after a render that is not regarded as a leak.
+# Independent of the size of the input, so a leaked document shows.
+retained_tolerance = 4 * 1024
+
+def measure(render, source):
+    """
+    Return the peak and the retained memory in bytes of render(source).
+    """
+    # Warm up: caches and one-time initialization are not retained
+    # memory.
+    render(source)
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        # A copy made while tracing, so it shows if the render keeps
+        # the document alive.
+        document = source + "\n"
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        render(document)
+
+        peak = tracemalloc.get_traced_memory()[1]
+        del document
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return peak - start, retained - baseline
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=64*1024)
+    args = parser.parse_args()
+
+    context = benchmark_context()
+
+    def render(source):
+        to_html(source, context)
+
+    # A parser and compiler that live on, as in a worker process.
+    kept_parser = WikklyParser()
+    kept_output = io.StringIO()
+    kept_compiler = HTMLCompiler(context, kept_output)
+
+    def render_kept(source):
+        kept_output.seek(0)
+        kept_output.truncate()
+        kept_compiler.compile(kept_parser, source)
+        # The output is the caller’s to keep or drop.
+        kept_output.seek(0)
+        kept_output.truncate()
+
+    failed = []
+    for name, knobs in corpus.items():
+        source = generate_document(size=args.size, **knobs)
+        kb = len(source) / 1024
+
+        for how, function in ( ("to_html", render),
+                               ("kept", render_kept), ):
+            peak, retained = measure(function, source)
+            print("%-8s %-8s %10.1f kB/kB peak %10.1f B/kB retained" % (
+                name, how, peak / 1024 / kb, retained / kb))
+
+            if retained > retained_tolerance:
+                failed.append(f"{name} ({how})")
+
+    if failed:
+        print("Memory retained after rendering:", ", ".join(failed),
+              file=sys.stderr)
+        sys.exit(1)
+
+main()
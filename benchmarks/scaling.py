@@ -0,0 +1,115 @@
+"""
+Render generated documents of growing size, one construct at a time,
+fit time against size on a log-log scale and check that none of them
+scales worse than roughly linearly. Exits with status 1 if any does.
+
+    python benchmarks/scaling.py [--max-size bytes] [--expect-fail name]
+
+The default stops at 1 MB; use --max-size 16777216 for the full range.
+Constructs named with --expect-fail are reported but do not fail the
+check, for example when bisecting across a range of commits in which a
+check is known to fail.
+"""
+import sys, math, time, argparse
+
+from wikklytext.to_html import to_html
+from wikklytext.benchmark import generate_document, benchmark_context
+
+# Generator knobs for documents dominated by one construct each.
+constructs = {
+    "prose": dict(list_depth=0, table_rows=0, macro_density=0,
+                  link_density=0, definition_lists=False),
+    "macros": dict(list_depth=0, table_rows=0, macro_density=30,
+                   link_density=0, definition_lists=False),
+    "tables": dict(list_depth=0, table_rows=200, table_columns=8,
+                   macro_density=0, link_density=0, definition_lists=False),
+    "deep lists": dict(list_depth=10, table_rows=0, macro_density=0,
+                       link_density=0, definition_lists=False),
+    "definitions": dict(list_depth=0, table_rows=0, macro_density=0,
+                        link_density=0, definition_lists=True),
+    "links": dict(list_depth=0, table_rows=0, macro_density=0,
+                  link_density=30, definition_lists=False),
+}
+
+# The exponent of the fitted power law time = c · size^k may be at most
+# this. Linear is 1.0.
+max_exponent = 1.25
+
+# Fixed costs dominate small documents and would hide growth at the
+# large end. The fit only uses documents of at least this size.
+min_fit_size = 16 * 1024
+
+def fit_exponent(sizes, timings):
+    """
+    Least squares fit of log(time) = k · log(size) + c. Return k.
+    """
+    xs = [ math.log(size) for size in sizes ]
+    ys = [ math.log(t) for t in timings ]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    return ( sum([ (x - mx) * (y - my) for x, y in zip(xs, ys) ])
+             / sum([ (x - mx) ** 2 for x in xs ]) )
+
+def time_render(source, context, repeat):
+    best = None
+    for a in range(repeat):
+        start = time.perf_counter()
+        to_html(source, context)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--min-size", type=int, default=1024)
+    parser.add_argument("--max-size", type=int, default=1024*1024)
+    parser.add_argument("--repeat", "-r", type=int, default=3)
+    parser.add_argument("--expect-fail", action="append", default=[],
+                        choices=list(constructs.keys()), metavar="name",
+                        help="A construct that is known to fail.")
+    args = parser.parse_args()
+
+    context = benchmark_context()
+
+    sizes = []
+    size = args.min_size
+    while size <= args.max_size or len(sizes) < 2:
+        sizes.append(size)
+        size *= 4
+
+    failed = []
+    for name, knobs in constructs.items():
+        lengths, timings = [], []
+        for size in sizes:
+            source = generate_document(size=size, **knobs)
+            # Large documents are timed once only.
+            repeat = args.repeat if size <= 256*1024 else 1
+            lengths.append(len(source))
+            timings.append(time_render(source, context, repeat))
+
+        fitted = [ (length, t,)
+                   for length, t in zip(lengths, timings)
+                   if length >= min_fit_size ]
+        if len(fitted) < 2:
+            fitted = list(zip(lengths, timings))[-2:]
+        exponent = fit_exponent(*zip(*fitted))
+        print("%-12s %s  exponent %4.2f" % (
+            name,
+            " ".join([ "%8.2fµs/kB" % (t / length * 1024 * 1e6,)
+                       for t, length in zip(timings, lengths) ]),
+            exponent,))
+
+        if name in args.expect_fail:
+            if exponent > max_exponent:
+                print("%-12s failed as expected" % name)
+            else:
+                print("%-12s passed though expected to fail" % name)
+        elif exponent > max_exponent:
+            failed.append(name)
+
+    if failed:
+        print("Worse than linear:", ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,64 @@
+"""
+Time building a SectionIndex and rendering single sections against
+rendering the whole document, for a generated document of growing
+size. Building the index lexes the whole document and must cost less
+than a full render, and the ids in the index must be those of the
+rendered headings. Exits with status 1 if either is not the case.
+
+    python benchmarks/sections.py [--size bytes]
+"""
+import sys, time, argparse
+
+from wikklytext.to_html import to_html, to_html_and_toc
+from wikklytext.sections import SectionIndex, to_html_section
+from wikklytext.benchmark import generate_document, benchmark_context
+
+# The index may take at most this fraction of the time of a full render.
+max_index_fraction = 0.8
+
+def best_of(function, repeat=3):
+    best = None
+    for a in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=256*1024)
+    args = parser.parse_args()
+
+    context = benchmark_context()
+    source = generate_document(size=args.size, table_rows=0)
+
+    full = best_of(lambda: to_html(source, context))
+    build = best_of(lambda: SectionIndex(source, context))
+
+    index = SectionIndex(source, context)
+    start = time.perf_counter()
+    for a in range(len(index)):
+        to_html_section(source, a, context, index=index)
+    per_section = (time.perf_counter() - start) / max(len(index), 1)
+
+    print("%i bytes, %i sections" % ( len(source), len(index), ))
+    print("%-12s %10.2f ms" % ( "full render", full * 1000, ))
+    print("%-12s %10.2f ms  %5.1f%% of a full render" % (
+        "index", build * 1000, build / full * 100, ))
+    print("%-12s %10.2f ms  per section" % (
+        "section", per_section * 1000, ))
+
+    html, headings = to_html_and_toc(source, context)
+    if [ ( section.level, section.text, section.id, )
+         for section in index ] != headings:
+        print("The section ids differ from the rendered ones.",
+              file=sys.stderr)
+        sys.exit(1)
+
+    if build > full * max_index_fraction:
+        print("Building the section index is too slow.", file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,51 @@
+"""
+Time rendering many short inline snippets, as for titles and captions,
+with to_inline_html_batch(), with to_inline_html() and its pooled
+pipelines and with a new parser and compiler for each snippet.
+
+    python benchmarks/snippets.py [-n count]
+"""
+import io, time, argparse
+
+from wikklytext.parser import WikklyParser
+from wikklytext.to_html import ( to_inline_html, to_inline_html_batch,
+                                 InlineHTMLCompiler, )
+from wikklytext.benchmark import benchmark_context
+
+snippets = [ "A ''caption'' for the picture, number 17",
+             "Diedrich Vorberg",
+             "//Annual report// 2023 -- draft",
+             "[[Home|index]] » News", ]
+
+def unpooled(source, context):
+    output = io.StringIO()
+    compiler = InlineHTMLCompiler(context, output)
+    compiler.compile(WikklyParser(), source)
+    return output.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    context = benchmark_context()
+    to_inline_html_batch(snippets, context) # Warm up.
+
+    batch = [ snippets[a % len(snippets)] for a in range(args.count) ]
+    start = time.perf_counter()
+    to_inline_html_batch(batch, context)
+    elapsed = time.perf_counter() - start
+    print("%-10s %8.2f µs per snippet" % ( "batch",
+                                          elapsed / args.count * 1e6))
+
+    for name, render in ( ("pooled", to_inline_html),
+                          ("unpooled", unpooled), ):
+        start = time.perf_counter()
+        for a in range(args.count):
+            render(snippets[a % len(snippets)], context)
+        elapsed = time.perf_counter() - start
+
+        print("%-10s %8.2f µs per snippet" % (
+            name, elapsed / args.count * 1e6))
+
+main()
@@ -0,0 +1,49 @@
+"""
+Time to_summary_html() for a short teaser of generated documents of
+growing size. The teaser must cost about the same no matter how long
+the document is. Exits with status 1 if it does not.
+
+    python benchmarks/summary.py [--chars count]
+"""
+import sys, time, argparse
+
+from wikklytext.summary import to_summary_html
+from wikklytext.benchmark import generate_document, benchmark_context
+
+# Time for the largest document may be this many times that of the
+# smallest one.
+tolerance = 3.0
+
+def best_of(function, repeat=5):
+    best = None
+    for a in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chars", type=int, default=200)
+    args = parser.parse_args()
+
+    context = benchmark_context()
+    sizes = [ 4 * 1024, 256 * 1024, 2 * 1024 * 1024, ]
+
+    timings = []
+    for size in sizes:
+        source = generate_document(size=size)
+        timings.append(best_of(lambda: to_summary_html(
+            source, context, max_paragraphs=None, max_chars=args.chars)))
+        print("%10i bytes %10.3f ms" % ( len(source), timings[-1] * 1000, ))
+
+    ratio = timings[-1] / timings[0]
+    print("ratio %5.2f" % ratio)
+
+    if ratio > tolerance:
+        print("The summary’s cost grows with the document.", file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,76 @@
+"""
+Time the HTML table model for tables of growing size. The cost per
+cell should stay flat as the number of rows grows.
+
+The compiler’s table callbacks are driven directly, so the figures do
+not include lexing and parsing.
+
+    python benchmarks/tables.py [max_rows]
+"""
+import sys, time, io
+
+from wikklytext.to_html import HTMLCompiler, Context
+from wikklytext.macro import MacroLibrary
+
+def render_table(context, rows:int, columns:int, head_rows:int,
+                 stream_tables:bool):
+    compiler = HTMLCompiler(context, io.StringIO(), stream_tables)
+
+    compiler.beginTable()
+    for row in range(rows):
+        compiler.beginTableRow()
+        for column in range(columns):
+            compiler.beginTableCell(row < head_rows, None, [], {})
+            compiler.word("Cell")
+            compiler.other_characters(" ")
+            compiler.beginBold()
+            compiler.word(str(row))
+            compiler.endBold()
+            compiler.endTableCell()
+        compiler.endTableRow()
+    compiler.endTable()
+    compiler.end_document()
+
+    return compiler.get_html()
+
+def time_table(context, rows, columns, head_rows, stream_tables, repeat=3):
+    best = None
+    for a in range(repeat):
+        t = time.perf_counter()
+        render_table(context, rows, columns, head_rows, stream_tables)
+        elapsed = time.perf_counter() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    if len(sys.argv) > 1:
+        max_rows = int(sys.argv[1])
+    else:
+        max_rows = 16384
+
+    context = Context(MacroLibrary())
+    columns = 10
+
+    print("%8s %8s %10s %12s" % ( "rows", "cells", "sec", "µs/cell", ))
+    rows = 64
+    while rows <= max_rows:
+        for head_rows, stream_tables in ((1, False),
+                                         (rows, False),
+                                         (1, True),):
+            elapsed = time_table(context, rows, columns,
+                                 head_rows, stream_tables)
+            cells = rows * columns
+
+            if head_rows == rows:
+                comment = " (all header rows)"
+            elif stream_tables:
+                comment = " (streaming)"
+            else:
+                comment = ""
+
+            print("%8i %8i %10.4f %12.2f%s" % (
+                rows, cells, elapsed, elapsed / cells * 1e6, comment))
+        rows *= 4
+
+main()
@@ -0,0 +1,58 @@
+"""
+Time to_text() against rendering HTML and stripping its tags, for the
+documents of the benchmark corpus. Plain text must be the faster way.
+Exits with status 1 if it is not.
+
+    python benchmarks/to_text.py [--size bytes]
+"""
+import sys, time, argparse
+from html import unescape as html_unescape
+
+from wikklytext.to_html import to_html
+from wikklytext.to_text import to_text
+from wikklytext.utils import html_tag_re
+from wikklytext.benchmark import corpus, generate_document, benchmark_context
+
+def best_of(functions, repeat=7):
+    """
+    Return the best time of each of `functions`. They are called in
+    turn, so a slow moment of the machine does not favour either.
+    """
+    best = [ None, ] * len(functions)
+    for a in range(repeat):
+        for i, function in enumerate(functions):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            if best[i] is None or elapsed < best[i]:
+                best[i] = elapsed
+    return best
+
+def html_and_strip(source, context):
+    return html_unescape(html_tag_re.sub(" ", to_html(source, context)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=64*1024)
+    args = parser.parse_args()
+
+    context = benchmark_context()
+
+    slower = []
+    for name, knobs in corpus.items():
+        source = generate_document(size=args.size, **knobs)
+        text, stripped = best_of([ lambda: to_text(source, context),
+                                   lambda: html_and_strip(source, context), ])
+
+        print("%-12s to_text %8.2f ms  html+strip %8.2f ms  %5.1f%%" % (
+            name, text * 1000, stripped * 1000, text / stripped * 100, ))
+
+        if text >= stripped:
+            slower.append(name)
+
+    if slower:
+        print("to_text() is slower than stripping HTML for: "
+              + ", ".join(slower), file=sys.stderr)
+        sys.exit(1)
+
+main()
@@ -0,0 +1,80 @@
+"""
+Time writing the searchable text of many small documents with
+to_tsearch_copy() against compiling each with its own TSearchCompiler.
+The bulk stream must not be the slower way. Exits with status 1 if it
+is, or if bin/wikkly2tsearch-copy fails on a few files.
+
+    python benchmarks/tsearch_copy.py [--documents count] [--size bytes]
+"""
+import io, sys, time, argparse, pathlib, subprocess, tempfile
+
+from wikklytext.parser import WikklyParser
+from wikklytext.to_tsearch import TSearchCompiler, to_tsearch_copy
+from wikklytext.benchmark import corpus, generate_document, benchmark_context
+
+def best_of(function, repeat=3):
+    best = None
+    for a in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def one_by_one(documents, context):
+    for id, source in documents:
+        compiler = TSearchCompiler(context, io.StringIO())
+        compiler.compile(WikklyParser(), source)
+
+def check_cmdline():
+    """
+    Run bin/wikkly2tsearch-copy on a directory of documents and return
+    an error message or None.
+    """
+    script = pathlib.Path(__file__).parent.parent / "bin/wikkly2tsearch-copy"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for a in range(3):
+            pathlib.Path(tmpdir, f"{a}.wikkly").write_text(
+                generate_document(size=512, seed=a, **corpus["prose"]))
+
+        result = subprocess.run([ sys.executable, str(script), tmpdir, ],
+                                capture_output=True, text=True)
+
+    if result.returncode != 0:
+        return result.stderr.strip()
+    if result.stdout.count("\n") < 3:
+        return "wikkly2tsearch-copy wrote fewer rows than documents."
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--size", type=int, default=2048)
+    args = parser.parse_args()
+
+    error = check_cmdline()
+    if error is not None:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    context = benchmark_context()
+    documents = [ (a, generate_document(size=args.size, seed=a,
+                                        **corpus["mixed"]))
+                  for a in range(args.documents) ]
+
+    single = best_of(lambda: one_by_one(documents, context))
+    bulk = best_of(lambda: to_tsearch_copy(documents, io.StringIO(),
+                                           context))
+
+    print("%i documents of %i bytes" % ( args.documents, args.size, ))
+    print("%-12s %10.2f ms" % ( "one by one", single * 1000, ))
+    print("%-12s %10.2f ms  %5.1f%%" % ( "bulk", bulk * 1000,
+                                         bulk / single * 100, ))
+
+    if bulk > single:
+        print("The bulk stream is slower than compiling one by one.",
+              file=sys.stderr)
+        sys.exit(1)
+
+main()
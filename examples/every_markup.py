@@ -1,4 +1,5 @@
-from wikklytext import to_html, Context, Macro, MacroLibrary
+from wikklytext import Context, Macro, MacroLibrary
+from wikklytext.to_html import to_html
 
 class RedMacro(Macro):
     """
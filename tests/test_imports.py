@@ -0,0 +1,45 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import sys, subprocess, pathlib
+
+def imported_by(statement):
+    """
+    Return the names of the modules loaded by `statement` in a fresh
+    interpreter.
+    """
+    result = subprocess.run(
+        [ sys.executable, "-c",
+          statement + "; import sys; print('\\n'.join(sys.modules))", ],
+        capture_output=True, text=True, check=True,
+        cwd=pathlib.Path(__file__).parent.parent)
+    return set(result.stdout.split())
+
+def test_import_is_cheap():
+    for statement in ( "import wikklytext", "import wikklytext.macro", ):
+        modules = imported_by(statement)
+        assert not modules & { "ply", "icecream", "tinymarkup.cmdline",
+                               "wikklytext.parser", "wikklytext.to_html",
+                               "wikklytext.to_tsearch", }, statement
+
+def test_import_does_not_patch_builtins():
+    modules = imported_by("import wikklytext, builtins; "
+                          "assert not hasattr(builtins, 'ic')")
+    assert "wikklytext" in modules
+
+def test_lazy_attributes():
+    modules = imported_by("import wikklytext; wikklytext.HTMLCompiler")
+    assert "wikklytext.to_html" in modules
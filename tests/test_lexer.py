@@ -0,0 +1,72 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import pytest
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+from tinymarkup.exceptions import SyntaxError, UnknownMacro
+
+from wikklytext.parser import wikkly_base_lexer
+from wikklytext.lextokens import parse_macro_parameters_at
+from wikklytext.to_html import to_html
+
+def tokens(source):
+    lexer = wikkly_base_lexer.clone()
+    lexer.input(source)
+    ret = []
+    while True:
+        token = lexer.token()
+        if token is None:
+            return ret
+        ret.append( (token.type, token.value,) )
+
+def test_comments():
+    assert tokens("a /% comment %/ b") == [
+        ( "WORD", "a", ), ( "COMMENT", " /% comment %/ ", ),
+        ( "WORD", "b", ), ]
+
+    # An unterminated comment is text.
+    assert ( "OTHER_CHARACTERS", "/", ) in tokens("a /% open")
+
+def test_links():
+    assert tokens("[[text|target]]") == [
+        ( "LINK_AB", ( "text", "target", ), ), ]
+    assert tokens("[[text|open")[:2] == [ ( "OTHER_CHARACTERS", "[", ),
+                                          ( "OTHER_CHARACTERS", "[", ), ]
+
+def test_macro_parameters():
+    source = "<<m a \"b c\" '' k=1 >> rest"
+    end, args, kw = parse_macro_parameters_at(None, source, 3, ">>")
+    assert args == [ "a", "b c", None, ]
+    assert kw == { "k": "1", }
+    assert source[end:] == " rest"
+
+    # The whitespace before the end marker goes with it.
+    assert tokens("<<m x >>y") == [ ( "MACRO", ( "m", [ "x", ], {}, ), ),
+                                    ( "WORD", "y", ), ]
+
+    with pytest.raises(SyntaxError):
+        tokens('<<m """open >>')
+
+def test_table_caption_is_one_line():
+    assert tokens("|a|b|\n|caption|c\n")[-1] \
+        == ( "TABLE_CAPTION", "|caption|c\n", )
+
+def test_error_location():
+    with pytest.raises(UnknownMacro) as info:
+        to_html("one\ntwo\n\nthree <<nosuch>>\n", Context(MacroLibrary()))
+    assert info.value.location.lineno == 4
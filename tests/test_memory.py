@@ -0,0 +1,48 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import gc, tracemalloc
+
+from wikklytext.to_html import to_html
+from wikklytext.benchmark import corpus, generate_document, benchmark_context
+
+# See benchmarks/memory.py, which also reports the peak.
+retained_tolerance = 4 * 1024
+
+def retained(render, source):
+    """
+    Return the memory in bytes still allocated after render(source).
+    """
+    render(source) # Warm up.
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        document = source + "\n"
+        render(document)
+        del document
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+def test_to_html_retains_nothing():
+    context = benchmark_context()
+    for name, knobs in corpus.items():
+        source = generate_document(size=16*1024, **knobs)
+        assert retained(lambda source: to_html(source, context),
+                        source) < retained_tolerance, name
@@ -0,0 +1,40 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+
+from wikklytext.metadata import extract_metadata
+
+def test_links_and_macros():
+    metadata = extract_metadata(
+        "See [[the target|Target]], [[Other]] and http://example.com\n"
+        "<<toc depth=2>> @@red(): x@@\n")
+    assert metadata.link_targets == { "Target", "Other", }
+    assert [ url.target for url in metadata.urls ] == [ "http://example.com" ]
+    assert [ (call.name, call.args, call.kw, call.construct,)
+             for call in metadata.macros ] == [
+                     ( "toc", [], { "depth": "2", }, "macro", ),
+                     ( "red", [], {}, "start_tag", ), ]
+
+def test_headings():
+    metadata = extract_metadata("! One ''bold''\ntext\n!! Two\n")
+    assert [ (heading.level, heading.text, heading.location.lineno,)
+             for heading in metadata.headings ] == [ ( 1, "One bold", 1, ),
+                                                     ( 2, "Two", 3, ), ]
+
+def test_heading_after_table():
+    # A “!” in a table cell is not a heading, one after the table is.
+    metadata = extract_metadata("|! cell|\n! Heading\n")
+    assert [ heading.text for heading in metadata.headings ] == [ "Heading" ]
@@ -0,0 +1,87 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+
+import pytest
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from wikklytext.to_html import to_html
+from wikklytext.budget import RenderBudget, RenderBudgetExceeded, \
+    active_budget
+from wikklytext.stats import RenderStats, active_stats
+from wikklytext.trace import RenderTrace, active_trace
+
+def context():
+    return Context(MacroLibrary())
+
+source = "! Heading\n\nSome ''bold'' text.\n\n* one\n* two\n"
+
+@pytest.mark.parametrize("monitor_class,active", [
+    ( RenderBudget, active_budget, ),
+    ( RenderStats, active_stats, ),
+    ( RenderTrace, active_trace, ), ])
+def test_nested_monitors_restore_the_active_one(monitor_class, active):
+    outer, inner = monitor_class(), monitor_class()
+    assert active() is None
+
+    outer.enter(None, None)
+    assert active() is outer
+
+    inner.enter(None, None)
+    assert active() is inner
+    inner.leave(None, None)
+    assert active() is outer
+
+    outer.leave(None, None)
+    assert active() is None
+
+def test_budget():
+    html = to_html(source, context())
+    assert to_html(source, context(), budget=RenderBudget(
+        max_tokens=1000, max_output=1000)) == html
+
+    with pytest.raises(RenderBudgetExceeded) as info:
+        to_html(source, context(), budget=RenderBudget(max_tokens=5))
+    assert info.value.limit == "max_tokens"
+
+    with pytest.raises(RenderBudgetExceeded) as info:
+        to_html(source, context(), budget=RenderBudget(max_output=10))
+    assert info.value.limit == "max_output"
+
+    assert active_budget() is None
+
+def test_stats():
+    stats = RenderStats()
+    html = to_html(source, context(), stats=stats)
+    assert html == to_html(source, context())
+
+    result = stats.as_dict()
+    assert result["renders"] == 1
+    assert result["tokens"] > 0
+    assert result["output"] == len(html)
+    assert active_stats() is None
+
+def test_trace():
+    trace = RenderTrace()
+    to_html(source, context(), trace=trace)
+
+    events = trace.as_dict()["traceEvents"]
+    assert [ event["name"] for event in events
+             if event["cat"] == "document" ] == [ "document" ]
+    assert { event["cat"] for event in events } >= { "document", "block", }
+    assert active_trace() is None
@@ -0,0 +1,60 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from wikklytext.macro import WikklyMacro
+from wikklytext.to_html import to_html, to_html_and_toc
+from wikklytext.sections import SectionIndex, to_html_section
+from wikklytext.benchmark import generate_document, benchmark_context
+
+class red(WikklyMacro):
+    def html_element(self):
+        return '<span class="red">red</span>'
+
+def context():
+    return Context(MacroLibrary(red))
+
+def assert_ids_match(source, context):
+    html, headings = to_html_and_toc(source, context)
+    index = SectionIndex(source, context)
+    assert [ (section.level, section.text, section.id,)
+             for section in index ] == headings
+
+def test_ids_match_rendered_headings():
+    for source in ( "! Foo <<red>>\n\ntext\n",
+                    "! A ''b''\nnext\n!! A //b//\n\n!!! A b\n",
+                    "! [[Link text|target]] {{{code}}}\n! Foo\n! Foo\n",
+                    "{{{\n! not a heading\n}}}\n! Heading\n",
+                    "/%\n! not a heading\n%/\n! Heading\n",
+                    "|! cell|\n! Heading\n", ):
+        assert_ids_match(source, context())
+
+def test_ids_match_generated_documents():
+    for seed in range(5):
+        source = generate_document(size=8*1024, seed=seed)
+        assert_ids_match(source, benchmark_context())
+
+def test_sections():
+    source = "Preamble\n\n! One\none\n!! Two\ntwo\n! Three\nthree\n"
+    index = SectionIndex(source, context())
+    assert source[:index.preamble_end] == "Preamble\n\n"
+    assert [ section.id for section in index ] == [ "one", "two", "three", ]
+    assert source[index.section("one").body_start:
+                  index.section("one").end] == "one\n!! Two\ntwo\n"
+    assert to_html_section(source, "two", context(), index) \
+        == to_html("two\n", context())
@@ -0,0 +1,46 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from wikklytext.macro import WikklyMacro
+from wikklytext.summary import to_summary_html
+
+class image(WikklyMacro):
+    def html_element(self):
+        return '<img src="image.jpg" />'
+
+def context():
+    return Context(MacroLibrary(image))
+
+source = "First ''bold'' paragraph here.\n\nSecond one.\n\n* a list\n"
+
+def test_paragraphs():
+    assert to_summary_html(source, context()) \
+        == "<p>First <b>bold</b> paragraph here.</p>"
+    assert to_summary_html(source, context(), max_paragraphs=2) \
+        == "<p>First <b>bold</b> paragraph here.</p><p>Second one.</p>"
+
+def test_chars():
+    # Words are not cut, open tags are closed.
+    assert to_summary_html(source, context(), max_chars=8) \
+        == "<p>First <b>…</b></p>"
+
+def test_macros():
+    source = "Text <<image>> more.\n"
+    assert "<img" not in to_summary_html(source, context())
+    assert "<img" in to_summary_html(source, context(), macros="render")
@@ -0,0 +1,109 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+import io
+
+import pytest
+
+from tinymarkup.exceptions import RestrictionError
+
+from wikklytext.parser import WikklyParser
+from wikklytext.to_html import (to_html, to_html_and_toc, to_inline_html,
+                                toc_html, Pipeline, HTMLCompiler,
+                                InlineHTMLCompiler)
+from wikklytext.to_text import TextCompiler
+
+def context():
+    return Context(MacroLibrary())
+
+def test_heading_ids():
+    html, headings = to_html_and_toc("! Intro\n\ntext\n\n!! Intro\n",
+                                     context())
+    assert headings == [ (1, "Intro", "intro",), (2, "Intro", "intro-2",), ]
+    assert '<h1 id="intro">Intro</h1>' in html
+    assert '<h2 id="intro-2">Intro</h2>' in html
+
+def test_heading_ids_close_open_tags():
+    # Bold running to the end of the line is closed inside the heading.
+    source = "! A ''b\nnext\n"
+    html, headings = to_html_and_toc(source, context())
+    assert html.startswith('<h1 id="a-b">A <b>b</b></h1>')
+    assert html.replace(' id="a-b"', "") == to_html(source, context())
+
+def test_stray_pipes():
+    # A “|” at the end of a line outside a table is text.
+    assert to_html("a |\nb |\n\nc\n", context()) \
+        == "<p>a | b |</p><p>c </p>"
+
+def test_pipeline_reuse():
+    # A pipeline used before renders the next document from scratch.
+    pipeline = Pipeline(HTMLCompiler, context())
+    first = pipeline(context(), "! Heading\n\n|a|b|\n")
+    assert pipeline(context(), "text ''bold") == "<p>text <b>bold</b></p>"
+    assert pipeline(context(), "! Heading\n\n|a|b|\n") == first
+    assert to_html("! Heading\n\n|a|b|\n", context()) == first
+
+def test_pipeline_pool_size():
+    pipelines = [ Pipeline.take(compiler_class, context())
+                  for compiler_class in ( HTMLCompiler, InlineHTMLCompiler,
+                                          TextCompiler, )
+                  for a in range(Pipeline.pool_size) ]
+    for pipeline in pipelines:
+        pipeline.give_back()
+
+    taken = [ Pipeline.take(HTMLCompiler, context())
+              for a in range(Pipeline.pool_size * 3) ]
+    assert len(set(map(id, taken)) & set(map(id, pipelines))) \
+        <= Pipeline.pool_size
+
+def test_toc_html():
+    assert toc_html([ ( 1, "A", "a", ), ( 2, "B", "b", ), ( 2, "C", "c", ),
+                      ( 1, "D <x>", "d", ), ]) == (
+        '<ul><li><a href="#a">A</a>'
+        '<ul><li><a href="#b">B</a></li><li><a href="#c">C</a></li></ul>'
+        '</li><li><a href="#d">D &lt;x&gt;</a></li></ul>')
+
+def render(source, stream_tables):
+    output = io.StringIO()
+    compiler = HTMLCompiler(context(), output, stream_tables=stream_tables)
+    compiler.compile(WikklyParser(), source)
+    return output.getvalue()
+
+def test_streaming_tables():
+    # Streamed tables are written like buffered ones.
+    for source in ( "|!a|!b|\n|c|d|\n",
+                    "|!a|!b|\n|!c|!d|\n",
+                    "|caption|c\n|a|b|\n|c|d|\n\ntext\n",
+                    "|a|''b''|\n|c|d|\n\n|e|\n", ):
+        assert render(source, True) == render(source, False)
+
+    assert render("|!a|!b|\n|c|d|\n", True) == (
+        "<table><thead><tr><th>a</th><th>b</th></tr></thead>"
+        "<tbody><tr><td>c</td><td>d</td></tr></tbody></table>")
+
+def test_raw_html():
+    source = "<html><b>x</b></html>"
+    assert to_html(source, context()) \
+        == "<p>&lt;html&gt;&lt;b&gt;x&lt;/b&gt;&lt;/html&gt;</p>"
+    assert to_html(source, context(), allow_raw_html=True) == "<b>x</b>"
+
+def test_inline_html():
+    assert to_inline_html("a ''b''", context()) == "a <b>b</b>"
+    with pytest.raises(RestrictionError):
+        to_inline_html("|a|b|\n", context())
@@ -0,0 +1,53 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary, Macro
+
+from wikklytext.macro import WikklyMacro
+from wikklytext.to_text import to_text
+
+class red(Macro):
+    # A tinymarkup macro without add_text().
+    def tag_params(self):
+        return { "style": "color: red", }
+
+class note(WikklyMacro):
+    def add_text(self, writer, text):
+        writer.text(f"Note: {text}")
+
+def context():
+    return Context(MacroLibrary(red, note))
+
+def test_blocks():
+    assert to_text("! Heading\n\nSome ''bold'' text.\n\n"
+                   "* one\n* two\n", context()) \
+        == "Heading\n\nSome bold text.\n\n- one\n- two"
+
+def test_table():
+    assert to_text("|a|b|\n|c|d|\n", context()) == "a | b\nc | d"
+
+def test_macros():
+    assert to_text("<<note 'Hello'>> there", context()) \
+        == "Note: Hello there"
+
+def test_macros_without_add_text():
+    assert to_text("A word. <<red>>\n\n<<red>>\n\nMore.\n", context()) \
+        == "A word.\n\nMore."
+
+def test_table_cell_macros_without_add_text():
+    assert to_text("|red: cell|!red: head|\n", context()) == "cell | head"
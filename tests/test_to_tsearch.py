@@ -0,0 +1,51 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import io
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from wikklytext.to_tsearch import to_tsearch_copy
+
+def context():
+    return Context(MacroLibrary())
+
+def test_copy_rows():
+    output = io.StringIO()
+    count = to_tsearch_copy([ ( "a", "Hello world\n\n! Head\n", ),
+                              ( "b\tc", "Second document\n", ), ],
+                            output, context())
+    assert count == 2
+
+    rows = [ line.split("\t") for line in output.getvalue().splitlines() ]
+    assert rows[0][:2] == [ "a", "english", ]
+    assert "Head" in rows[0][2:6]
+    assert rows[0][5] == "Hello world"
+
+    # Tabs in ids are escaped.
+    assert rows[1][:2] == [ "b\\tc", "english", ]
+    assert output.getvalue().count("\n") == 2
+
+def test_copy_errors():
+    output = io.StringIO()
+    errors = {}
+    count = to_tsearch_copy([ ( "a", "One <<nosuch>>\n", ),
+                              ( "b", "Two\n", ), ],
+                            output, context(), errors)
+    assert count == 1
+    assert list(errors.keys()) == [ "a", ]
+    assert output.getvalue() == "b\tenglish\t\t\t\tTwo\n"
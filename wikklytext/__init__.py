@@ -1,2 +1,65 @@
-import icecream
-icecream.install()
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import importlib
+
+# The public names and the modules they live in. They are imported on
+# first use, so `import wikklytext` does not build the lexer or load
+# backends that are not used. The to_html() and to_text() functions are
+# not among them, because their names are those of their modules.
+_lazy = {
+    "to_inline_html": ".to_html",
+    "to_inline_html_batch": ".to_html",
+    "to_html_and_toc": ".to_html",
+    "toc_html": ".to_html",
+    "to_html_section": ".sections",
+    "to_summary_html": ".summary",
+    "SectionIndex": ".sections",
+    "HTMLCompiler": ".to_html",
+    "InlineHTMLCompiler": ".to_html",
+    "TSearchCompiler": ".to_tsearch",
+    "to_tsearch_copy": ".to_tsearch",
+    "TSearchCopyWriter": ".writer",
+    "TextCompiler": ".to_text",
+    "WikklyParser": ".parser",
+    "WikklyCompiler": ".compiler",
+    "WikklyMacro": ".macro",
+    "WikklySource": ".macro",
+    "ClassMacro": ".macro",
+    "RenderBudget": ".budget",
+    "RenderBudgetExceeded": ".budget",
+    "RenderStats": ".stats",
+    "RenderTrace": ".trace",
+    "extract_metadata": ".metadata",
+    "MetadataExtractor": ".metadata",
+    "Context": "tinymarkup.context",
+    "Macro": "tinymarkup.macro",
+    "MacroLibrary": "tinymarkup.macro",
+}
+
+__all__ = list(_lazy.keys())
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(_lazy[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
@@ -0,0 +1,198 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import sys, math, time, statistics, json, argparse, pathlib
+import platform, datetime, cProfile, pstats, tracemalloc
+
+from tinymarkup.exceptions import UnknownMacro
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from .macro import WikklyMacro
+from .benchmark import stages, compare, bench_class, bench_image
+from .utils import find_files
+
+# The wikkly-bench command: time real Wikkly files with the stages of
+# the benchmark suite in benchmark.py.
+
+class NullMacro(WikklyMacro):
+    """
+    Stand in for macros the benchmark does not know.
+    """
+    environments = { "block", "inline", }
+
+    def html_element(self, *args, **kw):
+        return ""
+
+    def tag_params(self, *args, **kw):
+        return {}
+
+    def add_searchable_text(self, writer, *args, **kw):
+        pass
+
+class BenchMacroLibrary(MacroLibrary):
+    """
+    Resolve macros the library does not contain to NullMacro, so real
+    pages can be timed without their site’s macros.
+    """
+    def get(self, name, location=None):
+        try:
+            return super().get(name, location)
+        except UnknownMacro:
+            return NullMacro
+
+def percentile(timings:list, p:float):
+    """
+    Nearest-rank percentile of a list of timings.
+    """
+    timings = sorted(timings)
+    rank = math.ceil(len(timings) * p / 100)
+    return timings[max(rank, 1) - 1]
+
+def time_backend(backend, source:str, context:Context,
+                 warmup:int, repeat:int, profile:cProfile.Profile=None):
+    for a in range(warmup):
+        backend(source, context)
+
+    timings = []
+    for a in range(repeat):
+        if profile is not None:
+            profile.enable()
+        start = time.perf_counter()
+        backend(source, context)
+        timings.append(time.perf_counter() - start)
+        if profile is not None:
+            profile.disable()
+
+    return { "min": min(timings),
+             "median": statistics.median(timings),
+             "p95": percentile(timings, 95),
+             "p99": percentile(timings, 99),
+             "bytes": len(source), }
+
+def peak_memory(backend, source:str, context:Context):
+    """
+    Return the peak memory in bytes allocated during a single run.
+    """
+    tracemalloc.start()
+    try:
+        backend(source, context)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def cmdline_main():
+    parser = argparse.ArgumentParser(
+        description="Time Wikkly files with each of the selected backends.")
+    parser.add_argument("paths", type=pathlib.Path, nargs="+",
+                        help="Files or directories to search for files.")
+    parser.add_argument("--pattern", default="*.wikkly",
+                        help="Pattern of files to use in directories.")
+    parser.add_argument("--backends", "-b", default="html",
+                        help="Comma-separated list of " +
+                        ", ".join(stages.keys()) + ".")
+    parser.add_argument("--warmup", "-w", type=int, default=1)
+    parser.add_argument("--repeat", "-r", type=int, default=10)
+    parser.add_argument("--profile", "-p", type=pathlib.Path, default=None,
+                        help="Write cProfile stats of the timed runs "
+                        "to this file. This slows down the runs.")
+    parser.add_argument("--memory", "-m", action="store_true",
+                        help="Report the peak memory of a separate run.")
+    parser.add_argument("--outfile", "-o", type=argparse.FileType("w"),
+                        default=None, help="Write results as JSON.")
+    parser.add_argument("--compare", "-c", type=argparse.FileType("r"),
+                        default=None, help="Baseline JSON to compare to.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdown regarded as a regression "
+                        "(0.1 = 10%%).")
+    args = parser.parse_args()
+
+    backend_names = args.backends.split(",")
+    for name in backend_names:
+        if name not in stages:
+            parser.error(f"Unknown backend: {name}")
+
+    context = Context(BenchMacroLibrary(bench_class, bench_image))
+    profile = None if args.profile is None else cProfile.Profile()
+
+    results = {}
+    errors = 0
+    for path in find_files(args.paths, args.pattern):
+        source = path.read_text()
+        results[str(path)] = {}
+
+        for name in backend_names:
+            backend = stages[name]
+            try:
+                timing = time_backend(backend, source, context,
+                                      args.warmup, args.repeat, profile)
+                if args.memory:
+                    timing["peak_memory"] = peak_memory(backend, source,
+                                                        context)
+            except Exception as exc:
+                # Report the error and go on with the other files.
+                print("%-8s %s: %s: %s" % ( name, path, type(exc).__name__,
+                                            exc, ), file=sys.stderr)
+                errors += 1
+                continue
+
+            results[str(path)][name] = timing
+
+            line = "%-8s %10.4f min %10.4f median %10.4f p95 %10.4f p99 " \
+                "%8.2f µs/kB" % (
+                    name, timing["min"], timing["median"],
+                    timing["p95"], timing["p99"],
+                    timing["min"] / max(timing["bytes"], 1) * 1024 * 1e6)
+            if args.memory:
+                line += " %8.1f kB peak" % ( timing["peak_memory"] / 1024, )
+            print(line + "  " + str(path))
+
+    results = { "meta": { "python": platform.python_version(),
+                          "platform": platform.platform(),
+                          "date": datetime.datetime.now().isoformat(),
+                          "warmup": args.warmup,
+                          "repeat": args.repeat, },
+                "results": results, }
+
+    if args.outfile is not None:
+        json.dump(results, args.outfile, indent=2)
+
+    if profile is not None:
+        profile.dump_stats(args.profile)
+        print(file=sys.stderr)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats(
+            "cumulative").print_stats(20)
+
+    regressions = 0
+    if args.compare is not None:
+        baseline = json.load(args.compare)
+
+        print()
+        for (path, name, before,
+             after, ratio, regressed) in compare(results, baseline,
+                                                 args.threshold):
+            print("%-8s %10.4f → %10.4f sec %+7.1f%% %s  %s" % (
+                name, before, after, (ratio - 1.0) * 100,
+                "REGRESSION" if regressed else "", path))
+            if regressed:
+                regressions += 1
+
+    if errors or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    cmdline_main()
@@ -0,0 +1,341 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import sys, io, time, random, statistics, json, argparse, platform, datetime
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from .parser import WikklyParser, wikkly_base_lexer
+from .compiler import NullCompiler
+from .to_html import to_html, to_inline_html
+from .to_tsearch import TSearchCompiler
+from .to_text import to_text
+from .metadata import extract_metadata
+from .macro import WikklyMacro, WikklySource, ClassMacro
+
+# The benchmark suite: a generator for synthetic documents and timing of
+# each stage on a standard corpus of them. bench_files.py times real
+# files with the same stages.
+
+############################################################
+## Synthetic documents
+
+vocabulary = ( "lorem ipsum dolor sit amet consectetuer adipiscing elit sed "
+               "diam nonummy nibh euismod tincidunt ut laoreet dolore magna "
+               "aliquam erat volutpat wisi enim ad minim veniam quis nostrud "
+               "exerci tation ullamcorper suscipit lobortis nisl aliquip ex "
+               "ea commodo consequat duis autem vel eum iriure" ).split()
+
+class bench_class(ClassMacro):
+    """
+    Renders its parameter as nested Wikkly like most decorating
+    macros do.
+    """
+    def add_searchable_text(self, writer, contents:WikklySource):
+        contents.add_searchable_text(writer)
+
+class bench_image(WikklyMacro):
+    def html_element(self, filename, width:int=100):
+        return f'<img src="{filename}" width="{width}" />'
+
+    def add_searchable_text(self, writer, filename, width:int=100):
+        pass
+
+    def add_text(self, writer, filename, width:int=100):
+        pass
+
+def benchmark_context():
+    return Context(MacroLibrary(bench_class, bench_image))
+
+class DocumentGenerator(object):
+    """
+    Generate pseudo-random but valid Wikkly documents.
+
+    size -- Approximate size of the document in characters.
+    list_depth -- Maximum nesting of lists. 0 means no lists.
+    table_rows, table_columns -- Size of tables. 0 rows means no tables.
+    macro_density -- Macro calls per 100 words of running text.
+    link_density -- Links per 100 words of running text.
+    definition_lists -- Whether to include definition lists.
+    seed -- Seed for the random number generator.
+    """
+    def __init__(self, size:int=64*1024, list_depth:int=3,
+                 table_rows:int=10, table_columns:int=4,
+                 macro_density:float=1.0, link_density:float=2.0,
+                 definition_lists:bool=True, seed:int=0):
+        self.size = size
+        self.list_depth = list_depth
+        self.table_rows = table_rows
+        self.table_columns = table_columns
+        self.macro_density = macro_density
+        self.link_density = link_density
+        self.definition_lists = definition_lists
+        self.rng = random.Random(seed)
+
+    def words(self, count:int):
+        return " ".join([ self.rng.choice(vocabulary)
+                          for a in range(count) ])
+
+    def text(self, count:int):
+        """
+        Running text with inline markup, macro calls and links.
+        """
+        rng = self.rng
+        ret = []
+        for a in range(count):
+            r = rng.random() * 100
+            if r < self.macro_density:
+                if rng.random() < 0.5:
+                    ret.append(f"<<bench_class '{self.words(3)}'>>")
+                else:
+                    ret.append(f"<<bench_image 'img{a}.jpg' width=120>>")
+            elif r < self.macro_density + self.link_density:
+                if rng.random() < 0.5:
+                    ret.append(f"[[{self.words(2)}|target{a}]]")
+                else:
+                    ret.append(f"[[Target{a}]]")
+            elif r < self.macro_density + self.link_density + 3:
+                ret.append(f"''{self.words(2)}''")
+            elif r < self.macro_density + self.link_density + 6:
+                ret.append(f"//{self.words(2)}//")
+            else:
+                ret.append(rng.choice(vocabulary))
+        return " ".join(ret)
+
+    def paragraph(self):
+        return self.text(self.rng.randint(20, 80)) + "\n\n"
+
+    def heading(self):
+        return "!" * self.rng.randint(1, 3) + " " + self.words(4) + "\n\n"
+
+    def list(self):
+        ret = []
+        marker = self.rng.choice("*#")
+        level = 1
+        for a in range(self.rng.randint(3, 12)):
+            ret.append(marker * level + " " + self.text(8) + "\n")
+            level = self.rng.randint(1, min(level + 1, self.list_depth))
+        return "".join(ret) + "\n"
+
+    def table(self):
+        ret = []
+        columns = self.table_columns
+        ret.append("|" + "|".join([ "! " + self.words(1) + " "
+                                    for a in range(columns) ]) + "|\n")
+        for a in range(self.table_rows):
+            ret.append("|" + "|".join([ " " + self.text(3) + " "
+                                        for a in range(columns) ]) + "|\n")
+        return "".join(ret) + "\n"
+
+    def definition_list(self):
+        ret = []
+        for a in range(self.rng.randint(2, 6)):
+            ret.append("; " + self.words(2) + "\n")
+            ret.append(": " + self.text(10) + "\n")
+        return "".join(ret) + "\n"
+
+    def document(self):
+        blocks = [ self.paragraph, self.paragraph, self.paragraph,
+                   self.heading, ]
+        if self.list_depth:
+            blocks.append(self.list)
+        if self.table_rows:
+            blocks.append(self.table)
+        if self.definition_lists:
+            blocks.append(self.definition_list)
+
+        ret = []
+        length = 0
+        while length < self.size:
+            block = self.rng.choice(blocks)()
+            ret.append(block)
+            length += len(block)
+
+        return "".join(ret)
+
+def generate_document(**knobs):
+    return DocumentGenerator(**knobs).document()
+
+# The documents of the standard benchmark corpus. Each is generated with
+# these knobs and the size given on the command line.
+corpus = {
+    "prose": dict(list_depth=0, table_rows=0, macro_density=0,
+                  link_density=0, definition_lists=False),
+    "lists": dict(list_depth=6, table_rows=0, macro_density=0,
+                  link_density=0, definition_lists=False),
+    "tables": dict(list_depth=0, table_rows=50, table_columns=6,
+                   macro_density=0, link_density=0, definition_lists=False),
+    "macros": dict(list_depth=0, table_rows=0, macro_density=15,
+                   link_density=0, definition_lists=False),
+    "links": dict(list_depth=0, table_rows=0, macro_density=0,
+                  link_density=15, definition_lists=False),
+    "mixed": dict(),
+}
+
+############################################################
+## Stages
+
+def lex(source, context):
+    lexer = wikkly_base_lexer.clone()
+    lexer.input(source)
+    while lexer.token() is not None:
+        pass
+
+def parse(source, context):
+    compiler = NullCompiler(context)
+    compiler.compile(WikklyParser(), source)
+
+def html(source, context):
+    to_html(source, context)
+
+def inline(source, context):
+    to_inline_html(source, context)
+
+def tsearch(source, context):
+    compiler = TSearchCompiler(context, io.StringIO())
+    compiler.compile(WikklyParser(), source)
+
+def text(source, context):
+    to_text(source, context)
+
+def metadata(source, context):
+    extract_metadata(source)
+
+stages = { "lex": lex, "parse": parse, "html": html, "inline": inline,
+           "tsearch": tsearch, "text": text, "metadata": metadata, }
+
+# The synthetic corpus contains tables, which inline markup does not allow.
+corpus_stages = [ "lex", "parse", "html", "tsearch", "text", "metadata", ]
+
+def time_stage(stage, source:str, context:Context, repeat:int=5):
+    """
+    Run `stage` on `source` `repeat` times and return a dict with the
+    minimum and median time in seconds.
+    """
+    timings = []
+    for a in range(repeat):
+        start = time.perf_counter()
+        stage(source, context)
+        timings.append(time.perf_counter() - start)
+
+    return { "min": min(timings),
+             "median": statistics.median(timings),
+             "bytes": len(source), }
+
+def run_suite(size:int=64*1024, repeat:int=5, stage_names=None,
+              document_names=None, seed:int=0, report=None):
+    """
+    Run the selected stages on the selected documents of the benchmark
+    corpus and return the results as a dict that can be stored as JSON.
+    `report` is called as report(document_name, stage_name, timing)
+    after each measurement.
+    """
+    context = benchmark_context()
+    stage_names = stage_names or corpus_stages
+    document_names = document_names or list(corpus.keys())
+
+    results = {}
+    for document_name in document_names:
+        source = generate_document(size=size, seed=seed,
+                                   **corpus[document_name])
+        results[document_name] = {}
+        for stage_name in stage_names:
+            timing = time_stage(stages[stage_name], source, context, repeat)
+            results[document_name][stage_name] = timing
+            if report is not None:
+                report(document_name, stage_name, timing)
+
+    return { "meta": { "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "date": datetime.datetime.now().isoformat(),
+                       "size": size,
+                       "repeat": repeat,
+                       "seed": seed, },
+             "results": results, }
+
+def compare(results:dict, baseline:dict, threshold:float=0.1):
+    """
+    Compare the minimum times in `results` to those in `baseline`.
+    Return a list of (document_name, stage_name, baseline, current,
+    ratio, regressed,) for each measurement present in both.
+    """
+    ret = []
+    for document_name, stage_results in results["results"].items():
+        baseline_results = baseline["results"].get(document_name, {})
+        for stage_name, timing in stage_results.items():
+            if stage_name not in baseline_results:
+                continue
+
+            before = baseline_results[stage_name]["min"]
+            after = timing["min"]
+            ratio = after / before
+            ret.append( (document_name, stage_name, before, after, ratio,
+                         ratio > 1.0 + threshold,) )
+    return ret
+
+def cmdline_main():
+    parser = argparse.ArgumentParser(
+        description="Time lexing, parsing, HTML and tsearch output "
+        "for a synthetic corpus.")
+    parser.add_argument("--size", type=int, default=64*1024,
+                        help="Size of each document in characters.")
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(corpus_stages),
+                        help="Comma-separated list of stages.")
+    parser.add_argument("--documents", default=",".join(corpus.keys()),
+                        help="Comma-separated list of corpus documents.")
+    parser.add_argument("--outfile", "-o", type=argparse.FileType("w"),
+                        default=None, help="Write results as JSON.")
+    parser.add_argument("--compare", "-c", type=argparse.FileType("r"),
+                        default=None, help="Baseline JSON to compare to.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdown regarded as a regression "
+                        "(0.1 = 10%%).")
+    args = parser.parse_args()
+
+    def report(document_name, stage_name, timing):
+        print("%-8s %-8s %10.4f sec %10.2f µs/kB" % (
+            document_name, stage_name, timing["min"],
+            timing["min"] / timing["bytes"] * 1024 * 1e6))
+
+    results = run_suite(args.size, args.repeat,
+                        args.stages.split(","), args.documents.split(","),
+                        args.seed, report)
+
+    if args.outfile is not None:
+        json.dump(results, args.outfile, indent=2)
+
+    if args.compare is not None:
+        baseline = json.load(args.compare)
+        regressions = 0
+
+        print()
+        for (document_name, stage_name, before,
+             after, ratio, regressed) in compare(results, baseline,
+                                                 args.threshold):
+            print("%-8s %-8s %10.4f → %10.4f sec %+7.1f%% %s" % (
+                document_name, stage_name, before, after,
+                (ratio - 1.0) * 100, "REGRESSION" if regressed else ""))
+            if regressed:
+                regressions += 1
+
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    cmdline_main()
@@ -0,0 +1,162 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import time
+
+from tinymarkup.exceptions import MarkupError
+
+from .monitor import ActiveMonitor
+
+class RenderBudgetExceeded(MarkupError):
+    """
+    Raised when a render exceeds one of the limits of its RenderBudget.
+    The `limit` attribute names the limit that was hit.
+    """
+    def __init__(self, message, limit, location=None):
+        super().__init__(message, location=location)
+        self.limit = limit
+
+def active_budget():
+    """
+    Return the budget of the render currently running in this thread.
+    Nested renders (WikklySource parameters) pick it up from here.
+    """
+    return RenderBudget.active()
+
+class RenderBudget(ActiveMonitor):
+    """
+    Limits for a single render of untrusted Wikkly source. Any limit
+    set to None is not enforced.
+
+    max_seconds -- Wall clock time for the whole render.
+    max_tokens -- Number of tokens lexed, including nested renders.
+    max_output -- Number of characters a single render may write. A
+       parent’s output includes what its nested renders returned.
+    max_depth -- How deeply WikklySource renders may nest. The
+       top-level document is at depth 0.
+
+    The counters are reset when a top-level render starts, so a budget
+    may be reused for consecutive renders but not shared between
+    renders running concurrently.
+
+    Limits are checked between tokens and on output. A single lexer
+    match or macro call that runs long can not be interrupted.
+    """
+    slot = "budget"
+
+    # Check the clock only every so many tokens.
+    clock_interval = 64
+
+    def __init__(self, max_seconds:float=None, max_tokens:int=None,
+                 max_output:int=None, max_depth:int=None):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_output = max_output
+        self.max_depth = max_depth
+
+        self.depth = -1
+        self.tokens = 0
+        self.start_time = None
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        else:
+            return time.monotonic() - self.start_time
+
+    def enter(self, parser, compiler):
+        """
+        Called by WikklyParser.parse() when a (possibly nested) render
+        starts. The parser calls leave() in any case, even if this
+        raises an exception.
+        """
+        if self.depth < 0:
+            self.tokens = 0
+            self.start_time = time.monotonic()
+            self.activate()
+
+        self.depth += 1
+
+        # The parser has not started lexing yet and can not provide a
+        # location. For nested renders call_macro_method() will set it
+        # to the location of the macro call.
+        if self.max_depth is not None and self.depth > self.max_depth:
+            raise RenderBudgetExceeded(
+                f"Nested Wikkly exceeds the maximum depth of "
+                f"{self.max_depth}.", "max_depth")
+
+        self.check_time(None)
+
+        writer = getattr(compiler, "writer", None)
+        output = getattr(writer, "output", None)
+        if self.max_output is not None and output is not None:
+            writer.output = BudgetedOutput(output, self, parser)
+
+    def leave(self, parser, compiler):
+        writer = getattr(compiler, "writer", None)
+        output = getattr(writer, "output", None)
+        if isinstance(output, BudgetedOutput):
+            writer.output = output.output
+
+        self.depth -= 1
+        if self.depth < 0:
+            self.deactivate()
+
+    def count_token(self, parser):
+        self.tokens += 1
+
+        if self.max_tokens is not None and self.tokens > self.max_tokens:
+            raise RenderBudgetExceeded(
+                f"Render exceeds the limit of {self.max_tokens} tokens.",
+                "max_tokens", location=parser.location)
+
+        if self.tokens % self.clock_interval == 0:
+            self.check_time(parser)
+
+    def check_time(self, parser):
+        if self.max_seconds is not None \
+           and self.elapsed() > self.max_seconds:
+            if parser is None:
+                location = None
+            else:
+                location = parser.location
+
+            raise RenderBudgetExceeded(
+                f"Render exceeds the time limit of {self.max_seconds} "
+                f"seconds.", "max_seconds", location=location)
+
+class BudgetedOutput(object):
+    """
+    Wrap a compiler’s output file and count the characters written
+    to it.
+    """
+    def __init__(self, output, budget:RenderBudget, parser):
+        self.output = output
+        self.budget = budget
+        self.parser = parser
+        self.written = 0
+
+    def write(self, s):
+        self.written += len(s)
+        if self.written > self.budget.max_output:
+            raise RenderBudgetExceeded(
+                f"Render exceeds the output limit of "
+                f"{self.budget.max_output} characters.",
+                "max_output", location=self.parser.location)
+        return self.output.write(s)
+
+    def __getattr__(self, name):
+        return getattr(self.output, name)
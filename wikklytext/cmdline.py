@@ -0,0 +1,51 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+# The command line tools live here rather than with their backends, so
+# importing a backend does not import tinymarkup.cmdline.
+
+from tinymarkup.cmdline import CmdlineTool
+
+from .parser import WikklyParser
+from .to_html import HTMLCompiler
+from .to_tsearch import TSearchCompiler
+from .to_text import TextCompiler
+
+class HTMLCmdlineTool(CmdlineTool):
+    def to_html(self, outfile, source):
+        parser = WikklyParser()
+        compiler = HTMLCompiler(self.context, outfile, stream_tables=True)
+        compiler.compile(parser, source)
+
+class TSearchCmdlineTool(CmdlineTool):
+    def to_tsearch(self, outfile, source):
+        parser = WikklyParser()
+        compiler = TSearchCompiler(self.context, outfile)
+        compiler.compile(parser, source)
+
+    to_html = to_tsearch
+    def begin_html(self): pass
+    def end_html(self): pass
+
+class TextCmdlineTool(CmdlineTool):
+    def to_text(self, outfile, source):
+        parser = WikklyParser()
+        compiler = TextCompiler(self.context, outfile)
+        compiler.compile(parser, source)
+
+    to_html = to_text
+    def begin_html(self): pass
+    def end_html(self): pass
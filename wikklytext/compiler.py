@@ -25,9 +25,41 @@ from tinymarkup.compiler import Compiler
 from tinymarkup.writer import Writer
 from tinymarkup.macro import Macro
 
+from .stats import active_stats
+from .trace import active_trace
+
 empty = inspect.Parameter.empty
 
+# inspect.signature() is costly and needed for each macro call, so the
+# parameters are remembered by function. Bound methods are looked up by
+# the function they wrap.
+_parameters = {}
+
+def signature_parameters(function):
+    """
+    Return inspect.signature(function).parameters, cached.
+    """
+    key = ( getattr(function, "__func__", function),
+            hasattr(function, "__self__"), )
+    try:
+        return _parameters[key]
+    except KeyError:
+        parameters = inspect.signature(function).parameters
+        _parameters[key] = parameters
+        return parameters
+    except TypeError: # Unhashable
+        return inspect.signature(function).parameters
+
 class WikklyCompiler(Compiler):
+    # A RenderStats and a RenderTrace object, if the compiler’s work
+    # is to be recorded.
+    stats = None
+    trace = None
+
+    # Whether <html> … </html> is passed on as such, rather than as
+    # text, which may be a block of its own.
+    allow_raw_html = True
+
     def beginParagraph(self):
         print("beginParagraph")
 
@@ -197,6 +229,20 @@ class WikklyCompiler(Compiler):
     def other_characters(self, txt):
         print("other_chars: ", repr(txt))
 
+    def verbatim(self, txt):
+        """
+        The contents of code blocks, inline code and no-wiki text, not
+        to be interpreted at all.
+        """
+        print("verbatim: ", repr(txt))
+
+    def raw_html(self, html):
+        """
+        The contents of <html> … </html>, to be passed on unchanged
+        by backends that create HTML.
+        """
+        print("raw_html: ", repr(html))
+
     def call_macro(self, environment, macro_class, args, kw):
         print("macro: ", repr(environment), repr(macro_class), args, kw)
 
@@ -222,7 +268,7 @@ class WikklyCompiler(Compiler):
         it will be wrapped in a ErrorInMacroCall. In any case,
         the “location” information will be provided, if present.
         """
-        parameters_by_name = inspect.signature(method).parameters
+        parameters_by_name = signature_parameters(method)
         parameters = list(parameters_by_name.values())
 
         def convert_maybe(value, param):
@@ -232,17 +278,24 @@ class WikklyCompiler(Compiler):
             type indicated by the function parameter annotation.
             """
             if param.annotation is not empty:
+                # Writers and WikklySource objects passed on by the
+                # compiler need no conversion.
+                if isinstance(param.annotation, type) \
+                   and isinstance(value, param.annotation):
+                    return value
+
                 kw = {}
 
                 # If the param.annotation is callable and accepts a
                 # context parameter, provide it.
                 if callable(param.annotation):
                     try:
-                        sig = inspect.signature(param.annotation)
+                        annotation_parameters = signature_parameters(
+                            param.annotation)
                     except ValueError:
                         pass
                     else:
-                        for pp in sig.parameters.values():
+                        for pp in annotation_parameters.values():
                             if issubclass(pp.annotation, Context):
                                 kw[pp.name] = method.__self__.context
                             if issubclass(pp.annotation, Writer):
@@ -298,7 +351,18 @@ class WikklyCompiler(Compiler):
             if "location" in kw and not "location" in parameters_by_name:
                 del kw["location"]
 
-            return method(*args, **kw)
+            stats = active_stats()
+            trace = active_trace()
+            if stats is None and trace is None:
+                return method(*args, **kw)
+            elif trace is None:
+                return stats.call_macro(method, args, kw)
+            elif stats is None:
+                return trace.call_macro(method,
+                                        lambda: method(*args, **kw))
+            else:
+                return trace.call_macro(
+                    method, lambda: stats.call_macro(method, args, kw))
         except Exception as exc:
             if not isinstance(exc, MarkupError):
                 traceback.print_tb(exc.__traceback__)
@@ -307,3 +371,21 @@ class WikklyCompiler(Compiler):
             else:
                 exc.location = location
                 raise exc
+
+
+class NullCompiler(WikklyCompiler):
+    """
+    A compiler that ignores everything the parser tells it. Used to
+    time the lexer and parser by themselves. Macros are looked up but
+    not called.
+    """
+    def __init__(self, context):
+        WikklyCompiler.__init__(self, context)
+
+def _ignore(self, *args, **kw):
+    pass
+
+for name, value in list(vars(WikklyCompiler).items()):
+    if callable(value) and not name.startswith("_") \
+       and name != "call_macro_method":
+        setattr(NullCompiler, name, _ignore)
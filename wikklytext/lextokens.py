@@ -37,70 +37,211 @@ GNU General Public License for more details.
 #   <<name : Macro call
 #   [[A|B]] : Link
 #   [[A]] : Link
-####   {{{ ... }}}  : Code
+#   {{{ ... }}}  : Code, a block if {{{ and }}} are on lines of their own
 #   {{class{  : old: “CSS block begin” now: “inline macro call without params”
 #   }}}   : old: “CSS block end”, new: see above.
 #   ----  : Separator line
 #   ^\s*| : Begins table row (no leading text allowed per TiddlyWiki)
 #   EOLS  : One or more newlines, possibly with intermixed spaces
 #   <br>  : HTML <br>
+#   <html> .. </html> : Raw HTML
+#   """ .. """, <nowiki> .. </nowiki> : Text not interpreted as markup
 #   /% .. %/ : Comment
+#   ^/*** .. ***/, ^<!--- .. ---> : Comment regions, on lines of their own
 
 
-import re
+import re, bisect
 from tinymarkup.exceptions import Location, SyntaxError, LexerSetupError
 
+# These functions help lexer rules that need to find the end of a
+# construct further down the source. They are called with increasing
+# start positions, and without care a document full of unterminated
+# constructs would be scanned to its end once for each of them.
+
+def _find_cache(lexer):
+    """
+    Return a dict to pass to find_after() that is valid as long as
+    the lexer works on the same lexdata.
+    """
+    cache = getattr(lexer, "wikkly_find_cache", None)
+    if cache is None or cache[0] is not lexer.lexdata:
+        cache = ( lexer.lexdata, {}, )
+        lexer.wikkly_find_cache = cache
+    return cache[1]
+
+def find_after(source:str, needle:str, start:int, cache:dict=None):
+    """
+    Return source.find(needle, start). The result is remembered in
+    `cache`, so a later search from a position that has already been
+    scanned is answered without scanning the same text again.
+    """
+    if cache is not None and needle in cache:
+        searched_from, found = cache[needle]
+        if searched_from <= start and (found == -1 or found >= start):
+            return found
+
+    found = source.find(needle, start)
+
+    if cache is not None:
+        cache[needle] = ( start, found, )
+
+    return found
+
+# Locations are needed for every macro call but only looked at when
+# something goes wrong. Counting the lines up to a position each time
+# would make documents full of macro calls quadratic. Instead a
+# LazyLocation remembers the position and is turned into a Location
+# when one of its attributes is used, using a table of line starts that
+# is built once per document.
+
+class LineIndex(object):
+    def __init__(self, source:str):
+        self.source = source
+        self._starts = None
+
+    def line_of(self, pos:int):
+        """
+        Return the line number (starting at 1) of `pos` and the
+        offsets of the start and end of that line.
+        """
+        if self._starts is None:
+            self._starts = [ 0, ] + [ match.end() for match in
+                                      re.finditer("\n", self.source) ]
+
+        lineno = bisect.bisect_right(self._starts, pos)
+        start = self._starts[lineno-1]
+        if lineno < len(self._starts):
+            end = self._starts[lineno] - 1
+        else:
+            end = len(self.source)
+
+        return lineno, start, end
+
+def _line_index(lexer):
+    index = getattr(lexer, "wikkly_line_index", None)
+    if index is None or index.source is not lexer.lexdata:
+        index = LineIndex(lexer.lexdata)
+        lexer.wikkly_line_index = index
+    return index
+
+class _LinePosition(object):
+    """
+    What Location.from_baselexer() needs to know about a lexer.
+    """
+    def __init__(self, lexdata:str, lexpos:int):
+        self.lexdata = lexdata
+        self.lexpos = lexpos
+        self.lineno = 1
+
+class LazyLocation(Location):
+    def __init__(self, index:LineIndex, pos:int):
+        self._index = index
+        self._pos = pos
+
+    def __getattr__(self, name):
+        # Only called for attributes not set yet, that is, before the
+        # Location has been computed.
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        lineno, start, end = self._index.line_of(self._pos)
+
+        # Let tinymarkup compute the Location for the line by itself
+        # and correct the line number.
+        location = Location.from_baselexer(_LinePosition(
+            self._index.source[start:end], self._pos - start))
+        location.lineno += lineno - 1
+        self.__dict__.update(vars(location))
+
+        return object.__getattribute__(self, name)
+
+def lazy_location(lexer, pos:int=None):
+    """
+    Return a Location for `pos` in the lexer’s lexdata, by default its
+    current position.
+    """
+    if pos is None:
+        pos = lexer.lexpos
+    return LazyLocation(_line_index(lexer), pos)
+
 macro_parameter_re = re.compile(r"""
-    ^\s+                 # Every param, including the first, has leading space.
-      (?:([^\d\W]\w*)=)? # Optional “identifyer=”. No whitespace around the “=”.
-      (?:'''(.*?)''' |       # a
-         \"\"\"(.*?)\"\"\" | # b
-         '(.*?)' |           # c
-         "(.*?)" |           # d
-         ([^'">:\)\s]+)      # e
-                         # All the string literal types …
-      ) |                # … OR …
-    ^\s*(>>|\):)         # the end of the macro/@@id(): construct.
-    """, re.DOTALL | re.VERBOSE)
-def parse_macro_parameter_list_from(location:Location,
-                                    source:str, end_marker:str):
+    (?:\s+|(?<=\())        # Every param, including the first, has leading
+                           # space unless it directly follows an “(”.
+      (?:([^\d\W]\w*)=)?   # Optional “identifyer=”. No whitespace around
+                           # the “=”.
+      (?:('''|\"\"\"|'|") | # The opening quote of a string literal. Its
+                           # end is found using find_after().
+         ([^'">:\)\s]+)     # Unquoted literal.
+      ) |                  # … OR …
+    \s*(>>|\):)            # the end of the macro/@@id(): construct.
+    """, re.VERBOSE)
+def parse_macro_parameters_at(location:Location, source:str, pos:int,
+                              end_marker:str, cache:dict=None):
     """
-    Return a tipplet as (args, kw, remainder,)
+    Parse a macro parameter list in `source` starting at `pos`.
+    Return a tripplet as (end, args, kw,) with `end` pointing right
+    after the `end_marker`. Pass a `cache` for find_after() when
+    calling this repeatedly on the same source.
     """
     args = []
     kw = {}
     while True:
-        match = macro_parameter_re.search(source)
+        match = macro_parameter_re.match(source, pos)
 
         if match is None:
             raise SyntaxError("Syntax error in macro paramter",
                               location=location)
-        else:
-            found = len(match.group(0))
-            keyword, a, b, c, d, e, end = match.groups()
 
-            if end:
-                if end != end_marker:
-                    raise SyntaxError(f"Syntax error, can’t parse “{end}” in "
-                                      f"macro parameter list.",
-                                      location=location)
-                source = source[len(end):]
-                break
-
-            arg = a or b or c or d or e
-
-            if keyword is None:
-                if kw:
-                    raise SyntaxError("Syntax error: positional argument "
-                                      "follows named argument.",
-                                      location=location)
-                args.append(arg)
-            else:
-                kw[keyword] = arg
+        keyword, quote, unquoted, end = match.groups()
+        pos = match.end()
+
+        if end:
+            if end != end_marker:
+                raise SyntaxError(f"Syntax error, can’t parse “{end}” in "
+                                  f"macro parameter list.",
+                                  location=location)
+            # The whitespace before the end marker is consumed with it.
+            # (The parser used to skip only len(end) characters, which
+            # left “>>” behind in “<<macro x >>”.)
+            break
+
+        if quote:
+            closing = find_after(source, quote, pos, cache)
+            if closing == -1 and len(quote) == 3:
+                # Like '(.*?)' matches the first two of three unclosed
+                # quotes as an empty string.
+                quote = quote[0]
+                pos = pos - 2
+                closing = pos
+
+            if closing == -1:
+                raise SyntaxError("Syntax error in macro paramter",
+                                  location=location)
+
+            # Empty string literals are passed as None.
+            arg = source[pos:closing] or None
+            pos = closing + len(quote)
+        else:
+            arg = unquoted
+
+        if keyword is None:
+            if kw:
+                raise SyntaxError("Syntax error: positional argument "
+                                  "follows named argument.",
+                                  location=location)
+            args.append(arg)
+        else:
+            kw[keyword] = arg
 
-            source = source[found:]
+    return pos, args, kw,
 
-    return source, args, kw,
+def parse_macro_parameter_list_from(location:Location,
+                                    source:str, end_marker:str):
+    """
+    Return a tripplet as (remainder, args, kw,)
+    """
+    end, args, kw = parse_macro_parameters_at(location, source, 0, end_marker)
+    return source[end:], args, kw,
 
 
 tokens = (
@@ -125,15 +266,12 @@ tokens = (
     #'IMGSTART',
     'INLINE_BLOCK_START',
     'INLINE_BLOCK_END',
-    #'CODE_START',
-    #'CODE_END',
-    #'CODE_BLOCK',
-    #'CODE_BLOCK_CSS',
-    #'CODE_BLOCK_CPP',
-    #'CODE_BLOCK_HTML',
-    'C_COMMENT_START',
-    #'C_COMMENT_END',
-    'HTML_COMMENT_START',
+    'CODE_BLOCK',
+    'CODE_INLINE',
+    'RAW_HTML',
+    'NOWIKI',
+    'C_COMMENT',
+    'HTML_COMMENT',
     'HTML_COMMENT_END',
     'TABLEROW_START',
     'TABLEROW_END',
@@ -144,8 +282,6 @@ tokens = (
     # I'm leaving this as a comment so the length with match with
     # the list above.
     'CATCH_URL',
-    #'HTML_START',
-    #'HTML_END',
     'COMMENT',
     # NOTE: this never becomes a token - it turns into TEXT below
     # I'm leaving this as a comment so the length with match with
@@ -162,7 +298,69 @@ tokens = (
     #'RAWTEXT',
 )
 
-t_HTML_COMMENT_START = r'^<!---\n'
+rest_of_line_re = re.compile(r"[ \t]*(?:\n|\Z)")
+
+def find_end_line(source:str, pos:int, end_marker:str, cache:dict=None):
+    """
+    Find `end_marker`, which starts with a \n, after the start line of
+    a block that ends at `pos`, followed by nothing but the end of its
+    line. Return the position of the end marker and the end of its line
+    or (-1, None,).
+    """
+    # The \n the end marker starts with may be the one at the end of
+    # the start line.
+    start = pos - 1
+
+    # Like find_after(), remember the result. An end marker that is
+    # followed by more text on its line is no end for any start, so
+    # it is only looked at once. Without this, many starts followed by
+    # many false end markers would take quadratic time.
+    key = ( "end line", end_marker, )
+    if cache is not None and key in cache:
+        searched_from, end, line_end = cache[key]
+        if searched_from <= start and (end == -1 or end >= start):
+            return end, line_end
+
+    end = source.find(end_marker, start)
+    line_end = None
+    while end != -1:
+        match = rest_of_line_re.match(source, end + len(end_marker))
+        if match is not None:
+            line_end = match.end()
+            break
+        end = source.find(end_marker, end + 1)
+
+    if cache is not None:
+        cache[key] = ( start, end, line_end, )
+
+    return end, line_end
+
+def _find_end_line(lexer, end_marker):
+    return find_end_line(lexer.lexdata, lexer.lexpos, end_marker,
+                         _find_cache(lexer))
+
+# Comment regions, /*** … ***/ and <!--- … --->, each on lines of their
+# own, are consumed in one go and never reach the parser. As for code
+# blocks, the regex only matches the start line. Of an unterminated
+# region only the start line is dropped.
+def _comment_region(t, end_marker):
+    end, line_end = _find_end_line(t.lexer, end_marker)
+    if end != -1:
+        t.lexer.lexpos = line_end
+    return None
+
+comment_region_ends = { "/***": "\n***/",
+                        "<!---": "\n--->", }
+
+def t_C_COMMENT(t):
+    r"^/\*\*\*[ \t]*\n"
+    return _comment_region(t, comment_region_ends["/***"])
+
+def t_HTML_COMMENT(t):
+    r"^<!---[ \t]*\n"
+    return _comment_region(t, comment_region_ends["<!---"])
+
+# Outside a comment region this is text.
 t_HTML_COMMENT_END = r'^--->\n'
 
 # TABLES
@@ -203,7 +401,8 @@ def t_TABLE_CAPTION(t):
         r"(?P<tabcap_macroname>[^\d\W][\w]*)" # Macro name
         r"(?P<tabcap_macroend>[\(:])"         # opening of macro params or “:”
         r")?"  # close non-capturing group of optional macro start
-        r"(?P<tabcap>.*?)\|c" # Terminating “|”
+        r"(?P<tabcap>[^\n]*?)\|c" # Terminating “|”. The caption must
+                                   # not span lines.
         r"\s*\n" # The newline must be consumed by this re, or a EOLs will
         # cause the parser to end the table prematurely.
     )
@@ -232,23 +431,78 @@ def t_INLINE_BLOCK_START(t):
     return t
 
 t_INLINE_BLOCK_END = r"\}\}\}"
-#t_CODE_BLOCK = r"\{\{\{(.*?)\}\}\}"
-#t_CODE_BLOCK_CSS = r'^\/\*{{{\*\/(\n.*?\n)\/\*}}}\*\/'
-#t_CODE_BLOCK_CPP = r'^\/\/{{{(\n.*?\n)\/\/}}}'
-#t_CODE_BLOCK_HTML = r'^<!--{{{-->(\n.*?\n)<!--}}}-->'
-# note optional semicolon - need to catch for XSS filter
 
-t_COMMENT = r"[\s\n]*/%.*?%/[\s\n]*"
-# grab any leading & trailing whitespace so it doesn't cause a gap
+# Code is taken verbatim. The lexer rules only match the opening of a
+# code block or inline code and look up its end with find_after(), so
+# the contents are never lexed. The value of the token is the code.
+# Besides {{{ … }}} a code block may be opened and closed by lines
+# that are comments in CSS, C++ or HTML, so the block can be part of a
+# file in these languages.
+code_block_ends = { "{{{": "\n}}}",
+                    "/*{{{*/": "\n/*}}}*/",
+                    "//{{{": "\n//}}}",
+                    "<!--{{{-->": "\n<!--}}}-->", }
+
+def t_CODE_BLOCK(t):
+    (r"^(?P<code_block_start>"
+     r"\{\{\{|/\*\{\{\{\*/|//\{\{\{|<!--\{\{\{-->"
+     r")[ \t]*\n")
+    lexer = t.lexer
+    start = lexer.lexmatch.group("code_block_start")
+    end, line_end = _find_end_line(lexer, code_block_ends[start])
+    if end == -1:
+        return _other_character(t)
+
+    if end < lexer.lexpos:
+        t.value = ""
+    else:
+        t.value = lexer.lexdata[lexer.lexpos:end]
+
+    # Consume the end marker and the rest of its line.
+    lexer.lexpos = line_end
+
+    return t
+
+def _grab_until(t, end_marker):
+    """
+    Make the text between the construct matched and `end_marker` the
+    value of `t` and consume both.
+    """
+    lexer = t.lexer
+    end = find_after(lexer.lexdata, end_marker, lexer.lexpos,
+                     _find_cache(lexer))
+    if end == -1:
+        return _other_character(t)
+
+    t.value = lexer.lexdata[lexer.lexpos:end]
+    lexer.lexpos = end + len(end_marker)
+    return t
+
+def t_CODE_INLINE(t):
+    r"\{\{\{"
+    return _grab_until(t, "}}}")
+
+# Raw HTML, <html> … </html>, is passed on to the output as it is, if
+# the compiler allows it. Text that is not to be interpreted as markup,
+# """ … """ or <nowiki> … </nowiki>, is passed on like code. Both are
+# grabbed as a whole. The markers are matched in lower case only, like
+# the end markers _grab_until() looks for.
+def t_RAW_HTML(t):
+    r"(?-i:<html>)"
+    return _grab_until(t, "</html>")
+
+nowiki_ends = { '"""': '"""',
+                "<nowiki>": "</nowiki>", }
+
+def t_NOWIKI(t):
+    r'(?P<nowiki_start>"""|(?-i:<nowiki>))'
+    start = t.lexer.lexmatch.group("nowiki_start")
+    return _grab_until(t, nowiki_ends[start])
+
+# note optional semicolon - need to catch for XSS filter
 
-t_C_COMMENT_START = r'^\/\*\*\*\n'
-# this is caught as a special case of ^*
-#t_C_COMMENT_END = r'^\*\*\*\/\n'
 
 t_HTML_BREAK = r"<\s*br\s*[/]?\s*>[ ]*\n?"
-#t_HTML_START = r"<html>"
-#t_HTML_END = r"</html>"
-# TiddlyWiki does not allow nesting, so grab all at once
 
 t_PIPECHAR = r"\|"
 t_NULLDOT = r"^\s*\.\s*$"
@@ -307,26 +561,34 @@ def t_LINK_A(t):
 
 # link: [[A|B]]
 def t_LINK_AB(t):
-    r"\[\[(?P<link_b_text>[^\|\[\]]+?)\|(?P<link_b_target>.*?)\]\]"
-    groupdict = t.lexer.lexmatch.groupdict()
-    t.value = ( groupdict["link_b_text"], groupdict["link_b_target"], )
+    # The regex only matches the beginning. The target runs up to the
+    # next “]]” which is found with find_after().
+    r"\[\[(?P<link_b_text>[^\|\[\]]+?)\|"
+    lexer = t.lexer
+    end = find_after(lexer.lexdata, "]]", lexer.lexpos, _find_cache(lexer))
+    if end == -1:
+        return _other_character(t)
+
+    text = lexer.lexmatch.groupdict()["link_b_text"]
+    target = lexer.lexdata[lexer.lexpos:end]
+    lexer.lexpos = end + 2
+
+    t.value = ( text, target, )
     return t
 
-
-# These functions provide a mechanism to access a copy of the base lexer
-# (a ply.lex.Lexer() object) to set its current position in the input
-# by accessing it through the LexToken object.
-
-def _get_remainder(lexer):
-    return lexer.lexdata[lexer.lexpos:]
-
-def _set_remainder(lexer, remainder):
-    if not lexer.lexoptimize:
-        assert lexer.lexdata.endswith(remainder)
-    lexer.lexpos = len(lexer.lexdata)-len(remainder)
+def _other_character(t):
+    """
+    Turn a token whose regex matched the beginning of a construct whose
+    end is missing into the token the lexer would have produced for its
+    first character.
+    """
+    t.type = "OTHER_CHARACTERS"
+    t.value = t.value[0]
+    t.lexer.lexpos = t.lexpos + 1
+    return t
 
 def _get_location(lexer):
-    return Location.from_baselexer(lexer)
+    return lazy_location(lexer)
 
 def t_MACRO(t):
     # Macro call - IMPORTANT - only grab the beginning - trying to catch
@@ -337,10 +599,11 @@ def t_MACRO(t):
     # not accidentally matched.
     r"<<[a-z_]+"
 
+    lexer = t.lexer
     macro_name = t.value[2:]
-    remainder, args, kw = parse_macro_parameter_list_from(
-        _get_location(t.lexer), _get_remainder(t.lexer), ">>")
-    _set_remainder(t.lexer, remainder)
+    lexer.lexpos, args, kw = parse_macro_parameters_at(
+        _get_location(lexer), lexer.lexdata, lexer.lexpos, ">>",
+        _find_cache(lexer))
 
     t.value = macro_name, args, kw
     return t
@@ -364,10 +627,15 @@ def t_START_TAG_MACRO_START(t):
     if macro_name.endswith("("):
         macro_name = macro_name[:-1]
 
-        source = " " + _get_remainder(t.lexer)
-        remainder, args, kw = parse_macro_parameter_list_from(
-            _get_location(t.lexer), source, "):")
-        _set_remainder(t.lexer, remainder.lstrip())
+        lexer = t.lexer
+        end, args, kw = parse_macro_parameters_at(
+            _get_location(lexer), lexer.lexdata, lexer.lexpos, "):",
+            _find_cache(lexer))
+
+        # lstrip() the lexdata
+        while end < len(lexer.lexdata) and lexer.lexdata[end].isspace():
+            end += 1
+        lexer.lexpos = end
     else:
         if t.lexer.lexdata[t.lexer.lexpos] != ":":
             raise SyntaxError("Missing “:” in start tag macro call.",
@@ -415,5 +683,26 @@ def t_EOLS(t):
 
     return t
 
+def t_COMMENT(t):
+    # /% … %/
+    #
+    # Grab any leading & trailing whitespace so it doesn't cause a gap.
+    # Leading whitespace is only taken from the beginning of a run of
+    # spaces so the rule does not re-scan the run from every position
+    # in it. The regex only matches the beginning, the comment’s end is
+    # found with find_after().
+    r"(?:(?<![ \t])\s*)?/%"
+    lexer = t.lexer
+    end = find_after(lexer.lexdata, "%/", lexer.lexpos, _find_cache(lexer))
+    if end == -1:
+        return _other_character(t)
+
+    match = trailing_whitespace_re.match(lexer.lexdata, end + 2)
+    lexer.lexpos = match.end()
+    t.value = lexer.lexdata[t.lexpos:lexer.lexpos]
+    return t
+
+trailing_whitespace_re = re.compile(r"\s*")
+
 def t_error(t):
     raise LexerSetupError(repr(t), location=Location.from_baselexer(t.lexer))
@@ -20,9 +20,10 @@ from tinymarkup.context import Context
 from tinymarkup.utils import html_start_tag
 from tinymarkup.writer import TSearchWriter
 
-from .to_html import to_html, to_inline_html
-from .parser import WikklyParser
-from .to_tsearch import TSearchCompiler
+from .writer import TextWriter
+
+# The backends are imported where they are used, so macro modules
+# can be imported without loading the parser.
 from . import lextokens
 
 class WikklyMacro(Macro):
@@ -104,6 +105,15 @@ class WikklyMacro(Macro):
     def finish_searchable_text(self, writer:TSearchWriter):
         pass
 
+    def add_text(self, writer:TextWriter, *args, **kw):
+        """
+        Called by the plain text compiler.
+        """
+        pass
+
+    def finish_text(self, writer:TextWriter):
+        pass
+
 eols_re = re.compile(lextokens.t_EOLS.__doc__)
 class WikklySource(object):
     def __init__(self, source, context:Context, macro:WikklyMacro):
@@ -112,6 +122,8 @@ class WikklySource(object):
         self.macro = macro
 
     def html(self):
+        from .to_html import to_html, to_inline_html
+
         if self.macro.environment == "block":
             return to_html(self.source, context=self.context)
         else:
@@ -134,9 +146,40 @@ class WikklySource(object):
         """
         Called by the tsearch compiler.
         """
+        from .parser import WikklyParser
+        from .to_tsearch import TSearchCompiler
+
         parser = WikklyParser()
         compiler = TSearchCompiler(self.context, None)
         compiler.writer = writer
+        compiler.nested = True
+        compiler.compile(parser, self.source)
+
+    def add_text(self, writer:TextWriter):
+        """
+        Called by the plain text compiler.
+        """
+        from .parser import WikklyParser
+        from .to_html import is_plain_text
+        from .to_text import TextCompiler, InlineTextCompiler
+        from .budget import active_budget
+        from .stats import active_stats
+        from .trace import active_trace
+
+        # Like to_inline_html(), leave text without markup to the writer.
+        if is_plain_text(self.source) and active_budget() is None \
+           and active_stats() is None and active_trace() is None:
+            writer.text(" ".join(self.source.split()))
+            return
+
+        if self.macro.environment == "block":
+            compiler_class = TextCompiler
+        else:
+            compiler_class = InlineTextCompiler
+
+        parser = WikklyParser()
+        compiler = compiler_class(self.context, None)
+        compiler.writer = writer
         compiler.compile(parser, self.source)
 
 
@@ -156,6 +199,10 @@ class DecoratorMacro(WikklyMacro):
         """
         return self.start_tag() + contents.html() + self.end_tag
 
+    def add_text(self, writer:TextWriter, contents:WikklySource=None):
+        if contents is not None:
+            contents.add_text(writer)
+
 class LanguageMacro(DecoratorMacro):
     """
     Base class for the languages used in a context. The macro’s name
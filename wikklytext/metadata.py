@@ -0,0 +1,285 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import sys, json, argparse, pathlib
+
+from tinymarkup.exceptions import Location
+
+from . import lextokens
+from .parser import wikkly_base_lexer, table_cell_source_re
+from .utils import find_files
+
+# Collect links, URLs, macro calls and headings from Wikkly source for
+# backlinks, macro usage reports, link checks and the like. This drives
+# the lexer only and keeps just enough state to know what a token means:
+# no macro is looked up or instantiated and no output is created.
+
+class Link(object):
+    def __init__(self, target:str, text:str, location:Location):
+        self.target = target
+        self.text = text
+        self.location = location
+
+    def as_dict(self):
+        return { "target": self.target,
+                 "text": self.text,
+                 "line": self.location.lineno, }
+
+class MacroCall(object):
+    """
+    A macro called in a document. `construct` is the Wikkly construct
+    that calls it, one of "macro" (<<name …>>), "start_tag" (@@name: …@@),
+    "inline_block" ({{name{ … }}}), "blockquote" (<<<name: … >>>),
+    "table_caption" and "table_cell".
+    """
+    def __init__(self, name:str, args:list, kw:dict, construct:str,
+                 location:Location):
+        self.name = name
+        self.args = args
+        self.kw = kw
+        self.construct = construct
+        self.location = location
+
+    def as_dict(self):
+        return { "name": self.name,
+                 "args": list(self.args),
+                 "kw": self.kw,
+                 "construct": self.construct,
+                 "line": self.location.lineno, }
+
+class Heading(object):
+    """
+    The heading’s source is source[start:end], including the “!”s but
+    not the newline that ends it.
+    """
+    def __init__(self, level:int, location:Location, start:int):
+        self.level = level
+        self.location = location
+        self.start = start
+        self.end = None
+        self._text = []
+
+    def add_text(self, text:str):
+        self._text.append(text)
+
+    @property
+    def text(self):
+        return " ".join("".join(self._text).split())
+
+    def as_dict(self):
+        return { "level": self.level,
+                 "text": self.text,
+                 "line": self.location.lineno, }
+
+class Metadata(object):
+    def __init__(self):
+        self.links = []
+        self.urls = []
+        self.macros = []
+        self.headings = []
+
+    @property
+    def link_targets(self):
+        return { link.target for link in self.links }
+
+    @property
+    def macro_names(self):
+        return { call.name for call in self.macros }
+
+    def as_dict(self):
+        return { "links": [ link.as_dict() for link in self.links ],
+                 "urls": [ url.as_dict() for url in self.urls ],
+                 "macros": [ call.as_dict() for call in self.macros ],
+                 "headings": [ heading.as_dict()
+                               for heading in self.headings ], }
+
+class MetadataExtractor(object):
+    """
+    Extract Metadata from Wikkly source. An extractor keeps its lexer,
+    so use one for a batch of documents.
+    """
+    def __init__(self):
+        self.lexer = wikkly_base_lexer.clone()
+
+    def extract(self, source:str) -> Metadata:
+        try:
+            return self._extract(source)
+        finally:
+            # Like WikklyParser.release_source().
+            self.lexer.input("")
+            self.lexer.lexmatch = None
+            self.lexer.wikkly_find_cache = None
+            self.lexer.wikkly_line_index = None
+
+    def _extract(self, source:str) -> Metadata:
+        lexer = self.lexer
+        lexer.input(source)
+
+        ret = Metadata()
+        heading = None
+        in_table = False
+        last_type = None
+
+        def location(pos):
+            return lextokens.lazy_location(lexer, pos)
+
+        def table_cell():
+            match = table_cell_source_re.match(lexer.lexdata, lexer.lexpos)
+            if match is None or match.group("macroname") is None:
+                return
+
+            args, kw = [], {}
+            if match.group("macroend") == "(":
+                # Skip the parameters like the parser does.
+                lexer.lexpos, args, kw = \
+                    lextokens.parse_macro_parameters_at(
+                        location(lexer.lexpos), lexer.lexdata,
+                        match.end("macroend"), "):",
+                        lextokens._find_cache(lexer))
+
+            ret.macros.append(MacroCall(match.group("macroname"), args, kw,
+                                        "table_cell",
+                                        location(match.start("macroname"))))
+
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                break
+
+            if heading is not None:
+                # A heading ends with its line.
+                if tok.type in { "EOLS", "TABLEROW_END", "TABLE_END", }:
+                    heading.end = tok.lexpos
+                    heading = None
+                elif tok.type in { "WORD", "OTHER_CHARACTERS", "LINK_A",
+                                   "CATCH_URL", "CODE_INLINE", "NOWIKI", }:
+                    heading.add_text(tok.value)
+                elif tok.type == "LINK_AB":
+                    heading.add_text(tok.value[0])
+
+            # A table ends with a line that is neither a row nor a
+            # caption, like in the parser.
+            if in_table and last_type in { "TABLEROW_END", "TABLE_CAPTION", } \
+               and tok.type not in { "TABLEROW_START", "TABLE_CAPTION", }:
+                in_table = False
+            last_type = tok.type
+
+            if tok.type == "LINK_A":
+                ret.links.append(Link(tok.value, None, location(tok.lexpos)))
+
+            elif tok.type == "LINK_AB":
+                text, target = tok.value
+                ret.links.append(Link(target, text, location(tok.lexpos)))
+
+            elif tok.type == "CATCH_URL":
+                ret.urls.append(Link(tok.value, tok.value,
+                                     location(tok.lexpos)))
+
+            elif tok.type in { "MACRO", "START_TAG_MACRO_START", }:
+                name, args, kw = tok.value
+                construct = "macro" if tok.type == "MACRO" else "start_tag"
+                ret.macros.append(MacroCall(name, args, kw, construct,
+                                            location(tok.lexpos)))
+
+            elif tok.type == "INLINE_BLOCK_START":
+                ret.macros.append(MacroCall(
+                    lexer.lexmatch.group("inlblk_macro_name"), [], {},
+                    "inline_block", location(tok.lexpos)))
+
+            elif tok.type == "BLOCKQUOTE_START":
+                name = lexer.lexmatch.group("blockquote_macro_start")
+                if name is not None:
+                    ret.macros.append(MacroCall(name, [], {}, "blockquote",
+                                                location(tok.lexpos)))
+
+            elif tok.type == "HEADING":
+                # Inside a table, this is a regular char.
+                if not in_table:
+                    start = tok.lexpos + tok.rawtext.index("!")
+                    heading = Heading(len(tok.value), location(start),
+                                      start)
+                    ret.headings.append(heading)
+
+            elif tok.type == "TABLE_CAPTION":
+                in_table = True
+                name = lexer.lexmatch.group("tabcap_macroname")
+                if name is not None:
+                    ret.macros.append(MacroCall(name, [], {},
+                                                "table_caption",
+                                                location(tok.lexpos)))
+
+            elif tok.type == "TABLEROW_START":
+                in_table = True
+                table_cell()
+
+            elif tok.type == "PIPECHAR":
+                if in_table:
+                    table_cell()
+
+            elif tok.type == "TABLE_END":
+                in_table = False
+
+        if heading is not None:
+            heading.end = len(source)
+
+        return ret
+
+def extract_metadata(source:str) -> Metadata:
+    return MetadataExtractor().extract(source)
+
+def extract_files(paths, pattern:str="*.wikkly"):
+    """
+    Extract Metadata from the files in `paths`, searching directories
+    for files that match `pattern`. Yield (path, metadata, exception,)
+    triplets. If a file cannot be read or lexed, metadata is None and
+    exception is what was raised.
+    """
+    extractor = MetadataExtractor()
+    for path in find_files(paths, pattern):
+        try:
+            yield path, extractor.extract(path.read_text()), None
+        except Exception as exc:
+            yield path, None, exc
+
+def cmdline_main():
+    parser = argparse.ArgumentParser(
+        description="Extract links, macro calls and headings from Wikkly "
+        "files without rendering them and write them as JSON.")
+    parser.add_argument("paths", type=pathlib.Path, nargs="+",
+                        help="Files or directories to search for files.")
+    parser.add_argument("--pattern", default="*.wikkly",
+                        help="Pattern of files to use in directories.")
+    parser.add_argument("--outfile", "-o", type=argparse.FileType("w"),
+                        default=sys.stdout)
+    args = parser.parse_args()
+
+    index = {}
+    errors = 0
+    for path, metadata, exc in extract_files(args.paths, args.pattern):
+        if exc is not None:
+            print("%s: %s: %s" % ( path, type(exc).__name__, exc, ),
+                  file=sys.stderr)
+            errors += 1
+        else:
+            index[str(path)] = metadata.as_dict()
+
+    json.dump(index, args.outfile, indent=2)
+
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    cmdline_main()
@@ -0,0 +1,44 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import threading
+
+# The budget, stats and trace of the render currently running in this
+# thread, if any, as attributes named by their class’s `slot`. Nested
+# renders and macro calls pick them up from here.
+_active = threading.local()
+
+class ActiveMonitor(object):
+    """
+    Mixin for the objects that watch a render. A monitor is activated
+    when its outermost render starts and deactivated when it ends. It
+    may be used inside a render watched by another monitor of the same
+    kind, which is active again once this one is deactivated.
+    """
+    slot = None
+    _previous = None
+
+    @classmethod
+    def active(cls):
+        return getattr(_active, cls.slot, None)
+
+    def activate(self):
+        self._previous = self.active()
+        setattr(_active, self.slot, self)
+
+    def deactivate(self):
+        setattr(_active, self.slot, self._previous)
+        self._previous = None
@@ -28,6 +28,9 @@ from tinymarkup.parser import Parser
 
 from . import lextokens
 from .compiler import WikklyCompiler
+from .budget import RenderBudget, active_budget
+from .stats import RenderStats, active_stats
+from .trace import RenderTrace, active_trace
 
 wikkly_base_lexer = ply.lex.lex(module=lextokens,
                                 reflags=re.MULTILINE|re.IGNORECASE|re.DOTALL,
@@ -35,6 +38,16 @@ wikkly_base_lexer = ply.lex.lex(module=lextokens,
                                 lextab=None)
 
 paragraph_break_re = re.compile("\n\n+")
+
+# Matched at the beginning of a table cell, right after its “|”.
+table_cell_source_re = re.compile(
+    r"(?P<excl>!?)" # Exclamation point or not.
+    r"(?:" # Non-capturing group: Optionsl macro call start.
+    r"(?P<macroname>[^\d\W][\w]*)" # Macro name
+    r"(?P<macroend>[\(:])"         # opening of macro params or “:”
+    r")?"  # close non-capturing group of optional macro start
+    r".*?\|") # The end of the cell must be there in any case.
+
 class WikklyParser(Parser):
     """
     Base class for content parser showing the required API.
@@ -42,10 +55,63 @@ class WikklyParser(Parser):
     You can also instantiate this by itself to show a trace of the
     tokens from the lexer.
     """
-    def __init__(self):
+    def __init__(self, budget:RenderBudget=None):
+        """
+        If a `budget` is given, the render is aborted with
+        RenderBudgetExceeded if it exceeds any of its limits. Nested
+        renders started from macros are subject to the budget of the
+        render that is running in the same thread.
+        """
         super().__init__(wikkly_base_lexer)
+        self.budget = budget
 
     def parse(self, source:str, compiler:WikklyCompiler):
+        budget = self.budget or active_budget()
+        stats = compiler.stats or active_stats()
+        trace = compiler.trace or active_trace()
+
+        try:
+            if budget is None and stats is None and trace is None:
+                self._parse(source, compiler, None, None, None)
+            else:
+                # Their leave() is called even if their enter() fails.
+                entered = []
+                try:
+                    for monitor in ( budget, stats, trace, ):
+                        if monitor is not None:
+                            entered.append(monitor)
+                            monitor.enter(self, compiler)
+
+                    self._parse(source, compiler, budget, stats, trace)
+                finally:
+                    for monitor in reversed(entered):
+                        monitor.leave(self, compiler)
+        finally:
+            self.release_source()
+
+    def release_source(self):
+        """
+        Drop the lexer’s references to the last source parsed, so a
+        parser (or compiler) that is kept around does not keep the
+        document and the strings sliced from it alive.
+        """
+        base = self.lexer.base
+        base.input("")
+        base.lexmatch = None
+        base.wikkly_find_cache = None
+        base.wikkly_line_index = None
+
+    @property
+    def location(self):
+        """
+        The current position of the lexer as a Location that is only
+        computed if one of its attributes is used.
+        """
+        return lextokens.lazy_location(self.lexer.base)
+
+    def _parse(self, source:str, compiler:WikklyCompiler,
+               budget:RenderBudget, stats:RenderStats,
+               trace:RenderTrace):
         # flags:
         #   * need to use re.M so beginning-of-line matches will
         #     work as expected
@@ -68,8 +134,6 @@ class WikklyParser(Parser):
         self.in_deflist = 0 # tiddlywiki does not let DL/DT/DD nest apparently, so don't worry about it
         in_defterm = 0 # in <DT>?
         in_defdef = 0  # in <DD>?
-        in_strip_ccomment = 0 # inside /*** ... ***/ block
-        in_html_comment = 0 # inside <!--- ... ---> block
         # since CSS blocks can nest, this is a list of currently open
         # blocks, by CSS name
         self.inline_block_stack = []
@@ -134,10 +198,11 @@ class WikklyParser(Parser):
                 macro = None
             else:
                 if macro_end == "(":
-                    remainder, args, kw = \
-                        lextokens.parse_macro_parameter_list_from(
-                            self.location, lexer.remainder, "):")
-                    lexer.remainder = remainder
+                    base = self.lexer.base
+                    base.lexpos, args, kw = \
+                        lextokens.parse_macro_parameters_at(
+                            self.location, base.lexdata, base.lexpos, "):",
+                            lextokens._find_cache(base))
 
                 macro_class = compiler.context.macro_library.get(
                     macro_name, self.location)
@@ -146,19 +211,15 @@ class WikklyParser(Parser):
 
             return (macro, args, kw)
 
-        table_cell_source_re = re.compile(
-            r"^(?P<excl>!?)" # Exclamation point or not.
-            r"(?:" # Non-capturing group: Optionsl macro call start.
-            r"(?P<macroname>[^\d\W][\w]*)" # Macro name
-            r"(?P<macroend>[\(:])"         # opening of macro params or “:”
-            r")?"  # close non-capturing group of optional macro start
-            r".*?\|") # The end of the cell must be there in any case.
         self.in_tablecell = False
         def beginTableCell():
             if self.in_tablecell:
                 compiler.endTableCell()
 
-            match = table_cell_source_re.match(self.lexer.remainder)
+            # Match in place rather than on a copy of lexer.remainder,
+            # so the cost of a cell does not depend on the document’s size.
+            base = self.lexer.base
+            match = table_cell_source_re.match(base.lexdata, base.lexpos)
             if match is None:
                 raise ParseError("Missing closing “|” for table cell.",
                                  location=self.location)
@@ -169,7 +230,7 @@ class WikklyParser(Parser):
                 header = True
 
                 # Advance the lexer to point right after the “!”.
-                self.lexer.lexpos += 1
+                base.lexpos += 1
             else:
                 header = False
 
@@ -177,7 +238,7 @@ class WikklyParser(Parser):
                                             groups["macroend"])
             if groups["macroname"] is not None \
                and groups["macroend"] == ":":
-                self.lexpos += len(groups["macroname"]) + 1
+                base.lexpos += len(groups["macroname"]) + 1
 
             compiler.beginTableCell( header, macro, args, kw )
             self.in_tablecell = True
@@ -190,15 +251,25 @@ class WikklyParser(Parser):
 
         last_token = (None,None)  # type,value
 
+        tokens = self.lexer.tokenize(source)
+        if stats is not None:
+            tokens = stats.timed_tokens(tokens)
+            compiler = stats.timed_compiler(compiler)
+        if trace is not None:
+            compiler = trace.traced_compiler(compiler)
+
         compiler.begin_document(self.lexer)
 
-        for tok in self.lexer.tokenize(source):
+        for tok in tokens:
             # ply.lex.lex() puts the regex match object in
             # lexer.lexmatch if the token has an associated
             # function.
             lexmatch = getattr(self.lexer.base, "lexmatch", None)
 
-            # check for EOF or over time limit
+            if budget is not None:
+                budget.count_token(self)
+
+            # check for EOF
             if tok is None:
                 # close any open lists
                 close_any_open_list()
@@ -503,55 +574,53 @@ class WikklyParser(Parser):
                     raise ParseError("Unexpected end of “{{{”-style CSS block.",
                                      location=self.location)
 
-            elif tok.type == 'HTML_COMMENT_START':
-                #print "******** C_COMMENT_START"
-                if in_html_comment:
-                    # already in HTML comment, treat as normal chars
-                    compiler.word(tok.value)
-                else:
-                    # begin HTML comment (strip comment markers)
-                    in_html_comment = 1
-
             elif tok.type == 'HTML_COMMENT_END':
-                #print "************* C_COMMENT_END"
-                if not in_html_comment:
-                    # not in HTML-comment, treat as normal chars
-                    compiler.word(tok.value)
-                else:
-                    # strip end markers
-                    in_html_comment = 0
-
-            # elif tok.type == 'CODE_BLOCK':
-            #     # regex grabs entire block since no nesting allowed
-            #     m = re.match(self.lexer.t_CODE_BLOCK,
-            #                  tok.value, re.M|re.I|re.S)
-            #     text = m.group(1)
-
-            #     compiler.handle_codeblock(text)
-
-            # elif tok.type == 'CODE_BLOCK_CSS':
-            #     # regex grabs entire block since no nesting allowed
-            #     m = re.match(self.lexer.t_CODE_BLOCK_CSS, tok.value,
-            #                  re.M|re.I|re.S)
-            #     text = m.group(1)
+                # Comment regions are dropped by the lexer, this one
+                # is not part of one, treat as normal chars.
+                compiler.word(tok.value)
 
-            #     compiler.handle_codeblock(text)
+            elif tok.type == 'CODE_BLOCK':
+                # The lexer grabs the entire block, its contents
+                # are passed on verbatim.
+                if self.in_paragraph:
+                    end_current_block()
 
-            # elif tok.type == 'CODE_BLOCK_CPP':
-            #     # regex grabs entire block since no nesting allowed
-            #     m = re.match(self.lexer.t_CODE_BLOCK_CPP, tok.value,
-            #                  re.M|re.I|re.S)
-            #     text = m.group(1)
+                if on_root_level():
+                    compiler.beginCodeBlock()
+                    compiler.verbatim(tok.value)
+                    compiler.endCodeBlock()
+                else:
+                    # In a list, table or the like.
+                    compiler.beginCodeInline()
+                    compiler.verbatim(tok.value)
+                    compiler.endCodeInline()
 
-            #     compiler.handle_codeblock(text)
+            elif tok.type == 'CODE_INLINE':
+                assure_paragraph()
+                compiler.beginCodeInline()
+                compiler.verbatim(tok.value)
+                compiler.endCodeInline()
+
+            elif tok.type == 'RAW_HTML':
+                # Like a macro call, raw HTML on a paragraph of its own
+                # is a block. Otherwise, or if the compiler will write
+                # it as text, it is part of a paragraph.
+                base = self.lexer.base
+                if not ( compiler.allow_raw_html and on_root_level()
+                         and ( starts_with_parbreak(base.lexdata,
+                                                    base.lexpos)
+                               or at_end(base.lexdata, base.lexpos) ) ):
+                    assure_paragraph()
 
-            # elif tok.type == 'CODE_BLOCK_HTML':
-            #     # regex grabs entire block since no nesting allowed
-            #     m = re.match(self.lexer.t_CODE_BLOCK_HTML, tok.value,
-            #                  re.M|re.I|re.S)
-            #     text = m.group(1)
+                compiler.beginRawHTML()
+                compiler.raw_html(tok.value)
+                compiler.endRawHTML()
 
-            #     compiler.handle_codeblock(text)
+            elif tok.type == 'NOWIKI':
+                assure_paragraph()
+                compiler.beginNoWiki()
+                compiler.verbatim(tok.value)
+                compiler.endNoWiki()
 
 
             #elif tok.type == 'CODE_START':
@@ -587,14 +656,12 @@ class WikklyParser(Parser):
             elif tok.type == 'TABLEROW_END':
                 if not in_table:
                     # split | portion from "\n" portion
-                    m = re.match(self.lexer.t_TABLEROW_END,
+                    m = re.match(lextokens.t_TABLEROW_END,
                                  tok.value, re.M|re.I|re.S)
                     compiler.word(m.group(1))
-                    # feed \n back to parser
-
-                    # Does this even word? Should this not talk back
-                    # the remainder to the last \n
-                    self.lexer.remainder = "\n" + self.lexer.remainder
+                    # feed \n back to parser by moving the lexer back
+                    # rather than copying the remainder.
+                    self.lexer.base.lexpos -= 1
                 else:
                     endTableCell()
                     compiler.endTableRow()
@@ -603,11 +670,11 @@ class WikklyParser(Parser):
             elif tok.type == 'TABLE_END':
                 if not in_table:
                     # split | portion from "\n" portion
-                    m = re.match(self.lexer.t_TABLE_END, tok.value,
+                    m = re.match(lextokens.t_TABLE_END, tok.value,
                                  re.M|re.I|re.S)
                     compiler.word(m.group(1))
                     # feed \n's back to parser
-                    self.lexer.remainder = m.group(2) + self.lexer.remainder
+                    self.lexer.base.lexpos -= len(m.group(2))
                 else:
                     endTableCell()
 
@@ -652,8 +719,10 @@ class WikklyParser(Parser):
                     name, self.location, )
 
                 parbreak_before = on_root_level()
-                parbreak_after = ( starts_with_parbreak(self.lexer.remainder)
-                                   or self.lexer.remainder.lstrip() == "" )
+                base = self.lexer.base
+                parbreak_after = ( starts_with_parbreak(base.lexdata,
+                                                        base.lexpos)
+                                   or at_end(base.lexdata, base.lexpos) )
 
                 environment = "inline"
                 if parbreak_before and parbreak_after:
@@ -668,7 +737,8 @@ class WikklyParser(Parser):
 
                 compiler.call_macro(environment,
                                     macro_class, args, kw,
-                                    Location.from_lextoken(tok))
+                                    lextokens.lazy_location(
+                                        self.lexer.base, tok.lexpos))
 
 
             elif tok.type == "START_TAG_MACRO_START":
@@ -726,6 +796,13 @@ class WikklyParser(Parser):
         compiler.end_document()
 
 parbreak_re = re.compile(lextokens.t_EOLS.__doc__)
-def starts_with_parbreak(remainder):
-    match = parbreak_re.match(remainder)
+def starts_with_parbreak(source, pos=0):
+    match = parbreak_re.match(source, pos)
     return (match is not None and match.group().count("\n") >= 2)
+
+end_re = re.compile(r"\s*\Z")
+def at_end(source, pos=0):
+    """
+    Whether there is nothing but whitespace left in `source` after `pos`.
+    """
+    return end_re.match(source, pos) is not None
@@ -0,0 +1,136 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import io
+
+from tinymarkup.context import Context
+from tinymarkup.macro import MacroLibrary
+
+from .parser import WikklyParser
+from .metadata import MetadataExtractor
+from .to_html import HTMLCompiler, to_html
+
+# Render a document one section at a time. A section is a heading and
+# the blocks below it up to the next heading of the same or a higher
+# level. The SectionIndex knows where the sections are. The lexer finds
+# the headings, as for the metadata. Each heading line is rendered by
+# itself with heading ids, so its text and id are made from the same
+# HTML as in to_html_and_toc().
+
+class Section(object):
+    """
+    The heading’s line is source[start:body_start], the blocks below it
+    are source[body_start:end].
+    """
+    def __init__(self, level:int, text:str, id:str, start:int,
+                 body_start:int):
+        self.level = level
+        self.text = text
+        self.id = id
+        self.start = start
+        self.body_start = body_start
+        self.end = None
+
+class SectionIndex(object):
+    """
+    The sections of a document. The index does not keep the document,
+    so it may be cached (or pickled) along with the document’s version
+    and used for as long as the document does not change.
+    """
+    def __init__(self, source:str, context:Context=None):
+        self.length = len(source)
+        self.sections = []
+
+        # The text before the first heading is source[:preamble_end].
+        self.preamble_end = self.length
+
+        if context is None:
+            context = Context(MacroLibrary())
+
+        # One compiler for all headings, so it makes their ids unique
+        # as it does within a document.
+        parser = WikklyParser()
+        compiler = HTMLCompiler(context, io.StringIO(), heading_ids=True)
+
+        open_sections = []
+        for heading in MetadataExtractor().extract(source).headings:
+            start = heading.start
+            body_start = source.find("\n", heading.end) + 1 or self.length
+
+            count = len(compiler.headings)
+            compiler.compile(parser, source[start:heading.end])
+            if len(compiler.headings) == count:
+                # Not a heading by itself.
+                continue
+            level, text, id = compiler.headings[count]
+
+            section = Section(heading.level, text, id, start, body_start)
+
+            while open_sections and open_sections[-1].level >= section.level:
+                open_sections.pop().end = start
+            open_sections.append(section)
+
+            if not self.sections:
+                self.preamble_end = start
+            self.sections.append(section)
+
+        for section in open_sections:
+            section.end = self.length
+
+        self._by_id = { section.id: section for section in self.sections }
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def section(self, key) -> Section:
+        """
+        Return a section by its position in the document (an int) or
+        by its id (a str).
+        """
+        if isinstance(key, str):
+            return self._by_id[key]
+        else:
+            return self.sections[key]
+
+    def check(self, source:str):
+        if len(source) != self.length:
+            raise ValueError("The section index was built for "
+                             "another version of the document.")
+
+def to_html_section(wikkly:str, key, context:Context=None,
+                    index:SectionIndex=None, include_heading:bool=False):
+    """
+    Render the blocks below the heading identified by `key`, a position
+    or an id as for SectionIndex.section(), and, if `include_heading`
+    is set, the heading itself. Pass the document’s cached `index`, or
+    one is built for `context`. Only the section is lexed. Line numbers
+    in errors count from the start of the section.
+    """
+    if index is None:
+        index = SectionIndex(wikkly, context)
+    else:
+        index.check(wikkly)
+
+    section = index.section(key)
+    if include_heading:
+        start = section.start
+    else:
+        start = section.body_start
+
+    return to_html(wikkly[start:section.end], context)
@@ -0,0 +1,202 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import time, io
+
+from .monitor import ActiveMonitor
+
+def active_stats():
+    """
+    Return the stats of the render currently running in this thread.
+    Nested renders and macro calls report to these.
+    """
+    return RenderStats.active()
+
+def macro_method_name(method):
+    return f"{type(method.__self__).__name__}.{method.__name__}"
+
+class RenderStats(ActiveMonitor):
+    """
+    Collect where a render spends its time. Pass an instance to
+    to_html(), to_inline_html(), HTMLCompiler or TSearchCompiler and
+    read it with as_dict() after the render.
+
+    Time is accounted to one of these phases at any moment, so they
+    add up to the total:
+
+    lexing -- in the lexer, including macro parameter parsing
+    parsing -- in WikklyParser itself
+    compiler -- in compiler callbacks other than macro methods
+    macros -- in macro methods, not counting nested renders
+
+    For each macro method called (html_element(), tag_params(),
+    add_searchable_text(), …) the number of calls and the time spent in
+    it, including nested renders, are kept. Nested renders of
+    WikklySource parameters are counted for the macro that started
+    them, as are the tokens they lexed.
+
+    Counters add up over consecutive renders until reset() is called.
+    """
+    slot = "stats"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phases = { "lexing": 0.0,
+                        "parsing": 0.0,
+                        "compiler": 0.0,
+                        "macros": 0.0, }
+        self.total = 0.0
+        self.tokens = 0
+        self.output = 0
+        self.renders = 0
+        self.max_depth = 0
+        self.macros = {}
+
+        self._phase = None
+        self._since = None
+        self._start = None
+        # Token count and phase at the start of each open render.
+        self._renders = []
+        self._macro_stack = []
+
+    def switch(self, phase:str):
+        """
+        Account the time since the last switch to the current phase,
+        make `phase` the current one and return the previous phase.
+        """
+        now = time.perf_counter()
+        previous = self._phase
+        if previous is not None:
+            self.phases[previous] += now - self._since
+        self._phase = phase
+        self._since = now
+        return previous
+
+    def enter(self, parser, compiler):
+        """
+        Called by WikklyParser.parse() when a (possibly nested) render
+        starts.
+        """
+        if not self._renders:
+            self.activate()
+            self._start = time.perf_counter()
+
+        previous = self.switch("parsing")
+        self._renders.append( (self.tokens, previous,) )
+        self.renders += 1
+        self.max_depth = max(self.max_depth, len(self._renders) - 1)
+
+        if self._macro_stack:
+            self._macro_stack[-1]["renders"] += 1
+
+    def leave(self, parser, compiler):
+        tokens, previous = self._renders.pop()
+        self.switch(previous)
+
+        if self._macro_stack:
+            self._macro_stack[-1]["tokens"] += self.tokens - tokens
+
+        if not self._renders:
+            self.total += time.perf_counter() - self._start
+            self.deactivate()
+
+            output = getattr(getattr(compiler, "writer", None),
+                             "output", None)
+            try:
+                self.output += output.tell()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+
+    def timed_tokens(self, tokens):
+        """
+        Wrap the lexer’s token generator to account for the time spent
+        producing each token.
+        """
+        tokens = iter(tokens)
+        while True:
+            previous = self.switch("lexing")
+            try:
+                tok = next(tokens)
+            except StopIteration:
+                return
+            finally:
+                self.switch(previous)
+
+            self.tokens += 1
+            yield tok
+
+    def timed_compiler(self, compiler):
+        return TimedCompiler(compiler, self)
+
+    def call_macro(self, method, args, kw):
+        """
+        Called by WikklyCompiler.call_macro_method() to call and time
+        a macro method.
+        """
+        key = macro_method_name(method)
+        if key not in self.macros:
+            self.macros[key] = { "calls": 0, "time": 0.0,
+                                 "renders": 0, "tokens": 0, }
+        entry = self.macros[key]
+        entry["calls"] += 1
+
+        self._macro_stack.append(entry)
+        previous = self.switch("macros")
+        start = time.perf_counter()
+        try:
+            return method(*args, **kw)
+        finally:
+            entry["time"] += time.perf_counter() - start
+            self.switch(previous)
+            self._macro_stack.pop()
+
+    def as_dict(self):
+        return { "total": self.total,
+                 "phases": dict(self.phases),
+                 "tokens": self.tokens,
+                 "output": self.output,
+                 "renders": self.renders,
+                 "max_depth": self.max_depth,
+                 "macros": { key: dict(value)
+                             for key, value in self.macros.items() }, }
+
+class TimedCompiler(object):
+    """
+    Stand in for a compiler in WikklyParser and account the time spent
+    in its methods to the “compiler” phase.
+    """
+    def __init__(self, compiler, stats:RenderStats):
+        self._compiler = compiler
+        self._stats = stats
+
+    def __getattr__(self, name):
+        value = getattr(self._compiler, name)
+        if not callable(value):
+            return value
+
+        stats = self._stats
+        def timed(*args, **kw):
+            previous = stats.switch("compiler")
+            try:
+                return value(*args, **kw)
+            finally:
+                stats.switch(previous)
+
+        # Cache the wrapper, so __getattr__() is not called again.
+        setattr(self, name, timed)
+        return timed
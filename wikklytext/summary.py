@@ -0,0 +1,149 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import io
+
+from tinymarkup.context import Context
+
+from .parser import WikklyParser
+from .to_html import HTMLCompiler
+
+# Render the beginning of a document as a teaser. The compiler counts
+# the paragraphs and the characters of text it writes and raises
+# SummaryComplete when it reaches its limit. That ends the parse, so
+# the rest of the document is never lexed, and the compiler closes what
+# is still open as it would at the end of the document.
+
+class SummaryComplete(Exception):
+    """
+    Raised by SummaryHTMLCompiler to stop the parser. It never leaves
+    to_summary_html().
+    """
+    pass
+
+class SummaryHTMLCompiler(HTMLCompiler):
+    # Written where the text was cut short.
+    ellipsis = "…"
+
+    def __init__(self, context, output, max_paragraphs:int=None,
+                 max_chars:int=None, macros:str="skip"):
+        """
+        Stop after `max_paragraphs` paragraphs or `max_chars`
+        characters of text, whichever comes first. `macros` is either
+        “skip”, to leave out macro calls and the tag parameters macros
+        provide, or “render” to call them as usual. Their output does
+        not count towards `max_chars`.
+        """
+        if macros not in { "skip", "render", }:
+            raise ValueError(f"Unknown macro policy: {macros!r}")
+
+        super().__init__(context, output)
+        self.max_paragraphs = max_paragraphs
+        self.max_chars = max_chars
+        self.render_macros = (macros == "render")
+
+        self.paragraphs = 0
+        self.chars = 0
+
+    def _stop(self):
+        self.print(self.ellipsis, end="")
+        raise SummaryComplete()
+
+    def _text(self, txt:str, whole:bool=False):
+        """
+        Write `txt` or as much of it as the character limit allows. If
+        `whole` is set, `txt` is only cut if it is the first text.
+        """
+        if self.max_chars is not None:
+            left = self.max_chars - self.chars
+            if len(txt) > left:
+                if left > 0 and not (whole and self.chars > 0):
+                    self._characters(txt[:left])
+                self._stop()
+            self.chars += len(txt)
+
+        self._characters(txt)
+
+    def word(self, txt:str):
+        self._text(txt, whole=True)
+
+    def other_characters(self, txt:str):
+        self._text(txt)
+
+    def verbatim(self, txt:str):
+        self._text(txt)
+
+    def handleLink(self, text, target=None):
+        if self.max_chars is not None:
+            if self.chars + len(text) > self.max_chars:
+                self._stop()
+            self.chars += len(text)
+        super().handleLink(text, target)
+
+    def endParagraph(self):
+        super().endParagraph()
+        self.paragraphs += 1
+        if self.max_paragraphs is not None \
+           and self.paragraphs >= self.max_paragraphs:
+            raise SummaryComplete()
+
+    def call_macro(self, environment, macro_class, args, kw, location):
+        if self.render_macros:
+            super().call_macro(environment, macro_class, args, kw, location)
+
+    def startStartTagMacro(self, macro_class, args, kw):
+        if self.render_macros:
+            super().startStartTagMacro(macro_class, args, kw)
+
+    def endStartTagMacro(self, macro_class):
+        if self.render_macros:
+            super().endStartTagMacro(macro_class)
+
+    def beginBlockquote(self, macro, args, kw):
+        if not self.render_macros:
+            macro = None
+        super().beginBlockquote(macro, args, kw)
+
+    def setTableCaption(self, caption:str, macro, args, kw):
+        if not self.render_macros:
+            macro = None
+        super().setTableCaption(caption, macro, args, kw)
+
+    def beginTableCell(self, header:bool, macro, args, kw):
+        if not self.render_macros:
+            macro = None
+        super().beginTableCell(header, macro, args, kw)
+
+def to_summary_html(wikkly:str, context:Context=None,
+                    max_paragraphs:int=1, max_chars:int=None,
+                    macros:str="skip"):
+    """
+    Render the beginning of `wikkly`: its first `max_paragraphs`
+    paragraphs or `max_chars` characters of text, whichever is shorter.
+    See SummaryHTMLCompiler for `macros`. The cost depends on the length
+    of the summary, not that of the document.
+    """
+    output = io.StringIO()
+    compiler = SummaryHTMLCompiler(context, output,
+                                   max_paragraphs=max_paragraphs,
+                                   max_chars=max_chars, macros=macros)
+    try:
+        compiler.compile(WikklyParser(), wikkly)
+    except SummaryComplete:
+        # Close whatever is open.
+        compiler.end_document()
+
+    return output.getvalue()
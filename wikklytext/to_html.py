@@ -18,7 +18,7 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
 """
 
-import sys, re, html, inspect, io
+import sys, re, html, inspect, io, threading
 from io import StringIO
 from html import escape as escape_html
 
@@ -27,38 +27,251 @@ from tinymarkup.context import Context
 from tinymarkup.exceptions import ( MarkupError, InternalError,
                                     RestrictionError,  UnsuitableMacro, )
 from tinymarkup.utils import html_start_tag
-from tinymarkup.cmdline import CmdlineTool
 
 from .parser import WikklyParser
 from .compiler import WikklyCompiler
+from .budget import RenderBudget, active_budget
+from .stats import RenderStats, active_stats
+from .trace import RenderTrace, active_trace
+from .utils import html_tag_re
+
+def to_html(wikkly, context:Context=None, budget:RenderBudget=None,
+            stats:RenderStats=None, trace:RenderTrace=None,
+            allow_raw_html:bool=False):
+    """
+    Render `wikkly` as HTML. See HTMLCompiler for `allow_raw_html`.
+    """
+    if budget is None and stats is None and trace is None \
+       and not allow_raw_html:
+        return Pipeline.render(HTMLCompiler, context, wikkly)
 
-def to_html(wikkly, context:Context=None):
     outfile = io.StringIO()
-    parser = WikklyParser()
-    compiler = HTMLCompiler(context, outfile)
+    parser = WikklyParser(budget)
+    compiler = HTMLCompiler(context, outfile, stats=stats, trace=trace,
+                            allow_raw_html=allow_raw_html)
     compiler.compile(parser, wikkly)
     return outfile.getvalue()
 
-def to_inline_html(wikkly, context:Context=None):
+def to_html_and_toc(wikkly, context:Context=None, budget:RenderBudget=None,
+                    stats:RenderStats=None, trace:RenderTrace=None,
+                    allow_raw_html:bool=False):
+    """
+    Render `wikkly` with id attributes on its headings in one pass.
+    Return the HTML and the headings as a list of (level, text, id,)
+    tuples. Cache the two together, so the table of contents is there
+    whenever the body is.
+    """
     outfile = io.StringIO()
-    parser = WikklyParser()
-    compiler = InlineHTMLCompiler(context, outfile)
+    parser = WikklyParser(budget)
+    compiler = HTMLCompiler(context, outfile, stats=stats, trace=trace,
+                            heading_ids=True, allow_raw_html=allow_raw_html)
+    compiler.compile(parser, wikkly)
+    return outfile.getvalue(), compiler.headings
+
+def toc_html(headings) -> str:
+    """
+    Return nested <ul> lists that link to `headings` as returned by
+    to_html_and_toc().
+    """
+    ret = []
+    levels = []
+    for level, text, id in headings:
+        while levels and levels[-1] > level:
+            levels.pop()
+            ret.append("</li></ul>")
+
+        if levels and levels[-1] == level:
+            ret.append("</li>")
+        else:
+            levels.append(level)
+            ret.append("<ul>")
+
+        ret.append(f'<li><a href="#{escape_html(id)}">'
+                   f'{escape_html(text)}</a>')
+
+    ret.append("</li></ul>" * len(levels))
+    return "".join(ret)
+
+html_start_tag_re = re.compile(r"<\s*([a-zA-Z][\w-]*)")
+slug_separator_re = re.compile(r"\W+")
+
+def heading_slug(text:str) -> str:
+    """
+    Turn a heading’s text into the basis for its id.
+    """
+    return slug_separator_re.sub("-", text.lower()).strip("-") or "section"
+
+def unique_id(id:str, used:set):
+    """
+    Return `id`, or if it is in `used`, the first of id-2, id-3 … that
+    is not, and add it to `used`.
+    """
+    ret = id
+    n = 1
+    while ret in used:
+        n += 1
+        ret = f"{id}-{n}"
+    used.add(ret)
+    return ret
+
+# Text that starts with a letter or digit and consists of letters,
+# digits, spaces and these punctuation characters only is lexed into
+# WORD and OTHER_CHARACTERS tokens, unless it contains one of the
+# sequences in plain_text_exceptions. Its inline HTML is the text
+# itself, escaped. The first character may not be a roman numeral,
+# which would start a list item.
+plain_text_re = re.compile(r'(?![\u2160-\u2188])[^\W_]'
+                           r'(?:[^\W_]|[ .,;:!?()"&%+=*#$’‘“”«»–—…°€§-])*\Z')
+plain_text_exceptions = ( "--", "mailto:", '"""', )
+
+def is_plain_text(wikkly:str):
+    """
+    Whether `wikkly` contains no markup at all.
+    """
+    if plain_text_re.match(wikkly) is None:
+        return False
+
+    lower = wikkly.lower()
+    for sequence in plain_text_exceptions:
+        if sequence in lower:
+            return False
+
+    return True
+
+def to_inline_html(wikkly, context:Context=None, budget:RenderBudget=None,
+                   stats:RenderStats=None, trace:RenderTrace=None,
+                   allow_raw_html:bool=False):
+    if budget is None and stats is None and trace is None \
+       and not allow_raw_html:
+        if is_plain_text(wikkly) and active_budget() is None \
+           and active_stats() is None and active_trace() is None:
+            return escape_html(wikkly)
+
+        return Pipeline.render(InlineHTMLCompiler, context, wikkly)
+
+    outfile = io.StringIO()
+    parser = WikklyParser(budget)
+    compiler = InlineHTMLCompiler(context, outfile, stats=stats,
+                                  trace=trace, allow_raw_html=allow_raw_html)
     compiler.compile(parser, wikkly)
     return outfile.getvalue()
 
+def to_inline_html_batch(snippets, context:Context=None, errors:dict=None):
+    """
+    Render a sequence of short Wikkly snippets to inline HTML and return
+    a list of the results, in order. All snippets are rendered by the
+    same pipeline, and those without markup are only escaped.
+
+    If `errors` is a dict, a MarkupError raised by a snippet is stored
+    in it with the snippet’s index as key, its result is None and the
+    batch goes on. Otherwise the error is raised.
+    """
+    fast_path = ( active_budget() is None and active_stats() is None
+                  and active_trace() is None )
+
+    ret = []
+    pipeline = None
+    for index, snippet in enumerate(snippets):
+        if fast_path and is_plain_text(snippet):
+            ret.append(escape_html(snippet))
+            continue
+
+        if pipeline is None:
+            pipeline = Pipeline.take(InlineHTMLCompiler, context)
+
+        try:
+            ret.append(pipeline(context, snippet))
+        except MarkupError as exc:
+            if errors is None:
+                raise
+
+            errors[index] = exc
+            ret.append(None)
+            pipeline = None
+
+    if pipeline is not None:
+        pipeline.give_back()
+
+    return ret
+
+# Pipelines not in use, for each thread. _pipelines.pools is a dict
+# with a list of pipelines for each compiler class.
+_pipelines = threading.local()
+
+def _pools():
+    pools = getattr(_pipelines, "pools", None)
+    if pools is None:
+        pools = _pipelines.pools = {}
+    return pools
+
+class Pipeline(object):
+    """
+    A parser, a compiler and an output buffer that are reused for
+    consecutive renders in the same thread, so rendering many short
+    snippets does not construct them again and again. Renders that nest
+    (WikklySource parameters) each get their own pipeline.
+    """
+    # Number of unused pipelines kept per thread, for all compiler
+    # classes together.
+    pool_size = 8
+
+    def __init__(self, compiler_class, context:Context):
+        self.compiler_class = compiler_class
+        self.output = io.StringIO()
+        self.parser = WikklyParser()
+        self.compiler = compiler_class(context, self.output)
+
+    def __call__(self, context:Context, source:str):
+        self.compiler.reset(context, self.output)
+        self.compiler.compile(self.parser, source)
+
+        ret = self.output.getvalue()
+        self.output.seek(0)
+        self.output.truncate()
+        return ret
+
+    @classmethod
+    def take(cls, compiler_class, context:Context):
+        pool = _pools().get(compiler_class)
+        if pool:
+            return pool.pop()
+        else:
+            return cls(compiler_class, context)
+
+    def give_back(self):
+        pools = _pools()
+        if sum(map(len, pools.values())) < self.pool_size:
+            pools.setdefault(self.compiler_class, []).append(self)
+
+    @classmethod
+    def render(cls, compiler_class, context:Context, source:str):
+        pipeline = cls.take(compiler_class, context)
+
+        # A pipeline whose render failed is left to the garbage
+        # collector, because its compiler may be in any state.
+        ret = pipeline(context, source)
+
+        pipeline.give_back()
+        return ret
+
 class TableCell(object):
-    def __init__(self, header:bool, params:dict):
+    """
+    A table cell does not keep its own output buffer. Its contents are
+    the slice start:end of the Table’s shared output buffer.
+    """
+    def __init__(self, header:bool, params:dict, start:int):
         self.header = header
         if header:
             self.tag = "th"
         else:
             self.tag = "td"
         self.params = params
-        self.output = StringIO()
+        self.start = start
+        self.end = None
 
-    def write_cell(self, compiler):
+    def write_cell(self, compiler, contents:str):
         compiler.open(self.tag, **self.params)
-        compiler.print(self.output.getvalue().strip(), end="")
+        compiler.print(contents[self.start:self.end].strip(), end="")
         compiler.close(self.tag)
 
 class Table(object):
@@ -67,12 +280,14 @@ class Table(object):
         self.original_output = compiler.writer.output
         self._caption = None
         self.tag_params = {}
+
+        # All cells write to this buffer. The cells are kept in a flat
+        # list, self._rows contains the index of each row’s first cell.
+        self.output = StringIO()
+        self._cells = []
         self._rows = []
-        self.compiler.writer.tag_stack.append("--in-table--")
 
-    @property
-    def current_row(self):
-        return self._rows[-1]
+        self.compiler.writer.tag_stack.append("--in-table--")
 
     @property
     def caption(self):
@@ -86,58 +301,76 @@ class Table(object):
         self.tag_params = params
 
     def make_row(self):
-        self._rows.append([])
+        self._rows.append(len(self._cells))
 
     def make_cell(self, header:bool, params:dict):
-        cell = TableCell(header, params)
-        self.current_row.append(cell)
-        self.compiler.output = cell.output
+        position = self.output.tell()
+        if self._cells:
+            self._cells[-1].end = position
+
+        self._cells.append(TableCell(header, params, position))
+        self.compiler.output = self.output
+
+    def rows(self):
+        """
+        Yield the rows of this table as lists of TableCell objects.
+        """
+        ends = self._rows[1:] + [len(self._cells)]
+        for start, end in zip(self._rows, ends):
+            yield self._cells[start:end]
+
+    @staticmethod
+    def is_head_row(row):
+        """
+        Return whether a row has all header cells in it.
+        """
+        for cell in row:
+            if not cell.header:
+                return False
+
+        return True
+
+    def open_table(self):
+        self.compiler.open("table", **self.tag_params)
 
-    def write_table(self):
-        print = self.compiler.print
-        open = self.compiler.open
-        close = self.compiler.close
+        if self.caption:
+            self.compiler.print(f'<caption>{self.caption}</caption>')
 
-        def is_head_row(row):
-            """
-            Return whether a row has all header cells in it.
-            """
+    def print_rows(self, rows, contents:str):
+        for row in rows:
+            self.compiler.open("tr")
             for cell in row:
-                if not cell.header:
-                    return False
+                cell.write_cell(self.compiler, contents)
+            self.compiler.close("tr")
 
-            return True
+    def write_table(self):
+        open = self.compiler.open
+        close = self.compiler.close
 
-        def print_rows(rows):
-            for row in rows:
-                open("tr")
-                for cell in row:
-                    cell.write_cell(self.compiler)
-                close("tr")
+        contents = self.output.getvalue()
 
-        open("table", **self.tag_params)
-
-        if self.caption:
-            print(f'<caption>{self.caption}</caption>')
+        self.open_table()
 
         # Split table head and body.
-        thead = []
-        tbody = self._rows
-        while tbody:
-            if is_head_row(self._rows[0]):
-                thead.append(self._rows[0])
-                del self._rows[0]
+        rows = list(self.rows())
+        head_count = 0
+        for row in rows:
+            if self.is_head_row(row):
+                head_count += 1
             else:
                 break
 
+        thead = rows[:head_count]
+        tbody = rows[head_count:]
+
         if thead:
             open("thead")
-            print_rows(thead)
+            self.print_rows(thead, contents)
             close("thead")
 
         if tbody:
             open("tbody")
-            print_rows(tbody)
+            self.print_rows(tbody, contents)
             close("tbody")
 
         close("table")
@@ -156,9 +389,122 @@ class Table(object):
             # to the original output.
             self.write_table()
 
+class StreamingTable(Table):
+    """
+    A Table that writes each row to the compiler’s output as soon as it
+    is complete rather than keeping all of them until the table ends.
+    Only the leading all-header rows are kept, because they go into
+    <thead>. The head is closed by the first row that contains a regular
+    cell. After that, the shared buffer never holds more than one row.
+
+    The table’s class and caption must be known when the first row is
+    written, so the caption line must be the table’s first line.
+    """
+    def __init__(self, compiler):
+        super().__init__(compiler)
+        self._in_head = True
+        self._table_opened = False
+
+    def make_row(self):
+        self.flush()
+        super().make_row()
+
+    def flush(self):
+        """
+        Write the buffered rows unless they all belong to the table head
+        which may still grow.
+        """
+        rows = list(self.rows())
+        if not rows:
+            return
+
+        if self._in_head and self.is_head_row(rows[-1]):
+            return
+
+        tag_stack = self.compiler.writer.tag_stack
+        if tag_stack.pop() != "--in-table--":
+            raise InternalError("Internal Error: Table nesting failed.",
+                                location=self.compiler.location)
+        self.compiler.writer.output = self.original_output
+
+        contents = self.output.getvalue()
+        if not self._table_opened:
+            self.open_table()
+            self._table_opened = True
+
+        if self._in_head:
+            if len(rows) > 1:
+                self.compiler.open("thead")
+                self.print_rows(rows[:-1], contents)
+                self.compiler.close("thead")
+            self.compiler.open("tbody")
+            self._in_head = False
+            rows = rows[-1:]
+
+        self.print_rows(rows, contents)
+
+        # Start over with an empty buffer.
+        self.output = StringIO()
+        self._cells = []
+        self._rows = []
+
+        self.compiler.writer.output = self.output
+        tag_stack.append("--in-table--")
+
+    def finalize(self):
+        self.flush()
+
+        if self.compiler.writer.tag_stack.pop() != "--in-table--":
+            raise InternalError("Internal Error: Table nesting failed.",
+                                location=self.compiler.location)
+
+        # Restore the compiler’s output stream.
+        self.compiler.writer.output = self.original_output
+
+        if self._table_opened:
+            self.compiler.close("tbody")
+            self.compiler.close("table")
+        elif self._rows:
+            # The table consists of head rows only.
+            self.write_table()
+
 class HTMLCompiler(WikklyCompiler):
-    def __init__(self, context, output):
+    def __init__(self, context, output, stream_tables=False,
+                 stats:RenderStats=None, trace:RenderTrace=None,
+                 heading_ids=False, allow_raw_html=False):
+        """
+        If `stream_tables` is set, table rows are written to `output`
+        as they are parsed instead of at the end of the table. This
+        keeps the memory used by very long tables constant.
+
+        Pass a RenderStats object as `stats` or a RenderTrace as
+        `trace` to record where the render spends its time.
+
+        If `heading_ids` is set, headings get id attributes made from
+        their text, unique within the document, and are collected in
+        self.headings as (level, text, id,) tuples.
+
+        The contents of <html> … </html> are only passed on unchanged
+        if `allow_raw_html` is set. Otherwise they are escaped like
+        any other text. Only set it for trusted input.
+        """
         WikklyCompiler.__init__(self, context)
+        self.reset(context, output)
+        self.stats = stats
+        self.trace = trace
+        self.heading_ids = heading_ids
+        self.allow_raw_html = allow_raw_html
+
+        if stream_tables:
+            self.table_class = StreamingTable
+        else:
+            self.table_class = Table
+
+    def reset(self, context, output):
+        """
+        Prepare the compiler to compile another document to `output`.
+        """
+        self.context = context
         self.writer = HTMLWriter(output, context.root_language)
 
         # Hook the writer’s methods into self for convenience
@@ -169,6 +515,11 @@ class HTMLCompiler(WikklyCompiler):
 
         self._table = None
 
+        self.headings = []
+        self._used_ids = set()
+        self._heading_output = None
+        self._heading_depth = 0
+
     # The table handling code above expects compiler.output to be there.
     @property
     def output(self):
@@ -187,6 +538,8 @@ class HTMLCompiler(WikklyCompiler):
     def end_document(self):
         if self._table:
             self.endTable()
+        if self._heading_output is not None:
+            self.endHeading()
         self.writer.close_all()
 
     def beginParagraph(self): self.open("p")
@@ -214,11 +567,8 @@ class HTMLCompiler(WikklyCompiler):
         self.open("span", class_="wikkly-highlight")
     def endHighlight(self): self.close("span")
 
-    def beginCodeInline(self):
-        print("beginCodeInline")
-
-    def endCodeInline(self):
-        print("endCodeInline")
+    def beginCodeInline(self): self.open("code")
+    def endCodeInline(self): self.close("code")
 
     # These are treated the same for HTML,
     # but different in tsearch.
@@ -226,6 +576,7 @@ class HTMLCompiler(WikklyCompiler):
         self.print(escape_html(txt), end="")
     word = _characters
     other_characters = _characters
+    verbatim = _characters
 
     def beginList(self, listtype):
         if listtype == "U":
@@ -251,10 +602,38 @@ class HTMLCompiler(WikklyCompiler):
         level = int(level)
         self._current_heading_level = level
 
-        self.open(f"h{level}")
+        if self.heading_ids:
+            # The id depends on the heading’s text, so its contents
+            # go to a buffer of their own, like table cells.
+            self._heading_output = self.output
+            self._heading_depth = len(self.writer.tag_stack)
+            self.output = StringIO()
+        else:
+            self.open(f"h{level}")
 
     def endHeading(self):
-        self.close(f"h{self._current_heading_level}")
+        level = self._current_heading_level
+
+        if self.heading_ids:
+            # Close the tags still open inside the heading, like
+            # closing the h tag does when it is on the stack below them.
+            tag_stack = self.writer.tag_stack
+            while len(tag_stack) > self._heading_depth:
+                self.close(tag_stack[-1])
+
+            contents = self.output.getvalue()
+            self.output = self._heading_output
+            self._heading_output = None
+
+            text = " ".join(html.unescape(
+                html_tag_re.sub("", contents)).split())
+            id = unique_id(heading_slug(text), self._used_ids)
+            self.headings.append( (level, text, id,) )
+
+            self.open(f"h{level}", id=id)
+            self.print(contents, end="")
+
+        self.close(f"h{level}")
         self._current_heading_level = None
 
     def beginBlockquote(self, macro, args, kw):
@@ -279,13 +658,13 @@ class HTMLCompiler(WikklyCompiler):
             self.print(self.context.html_link_element(target, text), end="")
 
     def beginCodeBlock(self):
-        self.open("code")
+        self.open("pre")
 
     def endCodeBlock(self):
-        self.close("code")
+        self.close("pre")
 
     def beginTable(self):
-        self._table = Table(self)
+        self._table = self.table_class(self)
 
     def endTable(self):
         self._table.finalize()
@@ -328,17 +707,17 @@ class HTMLCompiler(WikklyCompiler):
     def endInlineBlock(self):
         print("endInlineBlock")
 
-    def beginRawHTML(self):
-        print("beginRawHTML")
-
-    def endRawHTML(self):
-        print("endRawHTML")
+    def beginRawHTML(self): pass
+    def endRawHTML(self): pass
 
-    def beginNoWiki(self):
-        print("beginNoWiki")
+    def raw_html(self, html):
+        if self.allow_raw_html:
+            self.print(html, end="")
+        else:
+            self._characters("<html>" + html + "</html>")
 
-    def endNoWiki(self):
-        print("endNoWiki")
+    def beginNoWiki(self): pass
+    def endNoWiki(self): pass
 
     # standalone tokens
     def separator(self):
@@ -390,6 +769,19 @@ class InlineHTMLCompiler(HTMLCompiler):
                                    location=self.parser.location)
         super().open(tag, **params)
 
+    # Code blocks are rendered as inline code.
+    def beginCodeBlock(self): self.beginCodeInline()
+    def endCodeBlock(self): self.endCodeInline()
+
+    def raw_html(self, html):
+        if self.allow_raw_html:
+            for match in html_start_tag_re.finditer(html):
+                if match.group(1).lower() in self.writer.block_level_tags:
+                    raise RestrictionError("You may only use inline "
+                                           "markup in this context.",
+                                           location=self.parser.location)
+        super().raw_html(html)
+
     def call_macro(self, what, macro, args, kw, location):
         if what == "block":
             what = "inline"
@@ -397,15 +789,20 @@ class InlineHTMLCompiler(HTMLCompiler):
 
 
 
-class CmdlineTool(CmdlineTool):
-    def to_html(self, outfile, source):
-        parser = WikklyParser()
-        compiler = HTMLCompiler(self.context, outfile)
-        compiler.compile(parser, source)
+def __getattr__(name):
+    # The command line tool used to be defined here as CmdlineTool. It
+    # is loaded on access, so importing this module does not import
+    # tinymarkup.cmdline.
+    if name == "CmdlineTool":
+        from .cmdline import HTMLCmdlineTool
+        return HTMLCmdlineTool
 
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def cmdline_main():
-    cmdline_tool = CmdlineTool()
+    from .cmdline import HTMLCmdlineTool
+
+    cmdline_tool = HTMLCmdlineTool()
     cmdline_tool()
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import io
+from html import unescape as html_unescape
+
+from tinymarkup.context import Context
+from tinymarkup.exceptions import UnsuitableMacro
+
+from .parser import WikklyParser
+from .compiler import WikklyCompiler
+from .writer import TextWriter
+from .budget import RenderBudget
+from .stats import RenderStats
+from .trace import RenderTrace
+from .to_html import Pipeline
+from .utils import html_tag_re
+
+# Render Wikkly as plain text, for email bodies, meta descriptions and
+# search indexes other than PostgreSQL’s. Paragraphs, headings and other
+# blocks are separated by blank lines, list items, table rows and
+# definitions start lines of their own. Nothing is escaped. Macros
+# contribute text through their add_text() and finish_text() methods.
+
+roman_numerals = ( ( 1000, "M", ), ( 900, "CM", ), ( 500, "D", ),
+                   ( 400, "CD", ), ( 100, "C", ), ( 90, "XC", ),
+                   ( 50, "L", ), ( 40, "XL", ), ( 10, "X", ), ( 9, "IX", ),
+                   ( 5, "V", ), ( 4, "IV", ), ( 1, "I", ), )
+
+def roman_numeral(n:int) -> str:
+    ret = []
+    for value, numeral in roman_numerals:
+        while n >= value:
+            ret.append(numeral)
+            n -= value
+    return "".join(ret)
+
+class TextCompiler(WikklyCompiler):
+    def __init__(self, context, output, stats:RenderStats=None,
+                 trace:RenderTrace=None):
+        WikklyCompiler.__init__(self, context)
+        self.reset(context, output)
+        self.stats = stats
+        self.trace = trace
+
+    def reset(self, context, output):
+        """
+        Prepare the compiler to compile another document to `output`.
+        """
+        self.context = context
+        self.writer = TextWriter(output, context.root_language)
+
+        # One [ listtype, number of items so far, ] pair per open list.
+        self._lists = []
+        self._table_cells = 0
+        self._blockquote_macro = None
+        self._table_macro = None
+
+    def end_document(self):
+        self.writer.finish()
+
+    def call_text_method(self, macro, name, args, kw, location=None):
+        """
+        Call the macro’s add_text() or finish_text() method. Macros
+        that do not derive from WikklyMacro may not have them. They
+        contribute no text.
+        """
+        method = getattr(macro, name, None)
+        if method is not None:
+            self.call_macro_method(method, args, kw, location)
+
+    def word(self, s:str):
+        self.writer.text(s)
+
+    other_characters = word
+
+    def verbatim(self, s:str):
+        self.writer.verbatim(s)
+
+    def raw_html(self, html:str):
+        # Tags separate words, whitespace is a single space.
+        text = html_unescape(html_tag_re.sub(" ", html))
+        if text[:1].isspace():
+            self.writer.text(" ")
+        self.writer.text(" ".join(text.split()))
+        if text[-1:].isspace():
+            self.writer.text(" ")
+
+    def beginParagraph(self): self.writer.start_block()
+    def endParagraph(self): pass
+    def beginBold(self): pass
+    def endBold(self): pass
+    def beginItalic(self): pass
+    def endItalic(self): pass
+    def beginStrikethrough(self): pass
+    def endStrikethrough(self): pass
+    def beginUnderline(self): pass
+    def endUnderline(self): pass
+    def beginSuperscript(self): pass
+    def endSuperscript(self): pass
+    def beginSubscript(self): pass
+    def endSubscript(self): pass
+    def beginHighlight(self, style=None): pass
+    def endHighlight(self): pass
+
+    def beginList(self, listtype):
+        if self._lists:
+            self.writer.push_indentation("   ")
+        else:
+            self.writer.start_block()
+        self._lists.append([ listtype, 0, ])
+
+    def endList(self, listtype):
+        self._lists.pop()
+        if self._lists:
+            self.writer.pop_indentation()
+        else:
+            self.writer.start_block()
+
+    def beginListItem(self, listtype):
+        current = self._lists[-1]
+        current[1] += 1
+
+        if listtype == "N":
+            self.writer.start_line(f"{current[1]}. ")
+        elif listtype == "R":
+            self.writer.start_line(f"{roman_numeral(current[1])}. ")
+        else:
+            self.writer.start_line("- ")
+
+    def endListItem(self, listtype): pass
+
+    def beginHeading(self, level): self.writer.start_block()
+    def endHeading(self): self.writer.start_block()
+
+    def beginBlockquote(self, macro, args, kw):
+        self.writer.start_block()
+        self.writer.push_indentation("  ")
+
+        self._blockquote_macro = macro
+        if macro is not None:
+            self.call_text_method(macro, "add_text",
+                                  [self.writer,] + args, kw,
+                                  self.parser.location)
+
+    def endBlockquote(self):
+        if self._blockquote_macro is not None:
+            self.call_text_method(self._blockquote_macro, "finish_text",
+                                  [self.writer], {},
+                                  self.parser.location)
+            self._blockquote_macro = None
+
+        self.writer.pop_indentation()
+        self.writer.start_block()
+
+    def beginLineIndent(self): pass
+    def endLineIndent(self): pass
+
+    def handleLink(self, text, target=None):
+        target = target or text
+        if not target.startswith("#"):
+            self.writer.text(text)
+
+    def beginCodeBlock(self): self.writer.start_block()
+    def endCodeBlock(self): self.writer.start_block()
+    def beginCodeInline(self): pass
+    def endCodeInline(self): pass
+
+    def beginTable(self): self.writer.start_block()
+    def endTable(self): self.writer.start_block()
+
+    def setTableCaption(self, caption:str, macro, args, kw):
+        self.writer.start_line()
+
+        if macro is not None:
+            self.call_text_method(macro, "add_text",
+                                  [self.writer,] + args, kw,
+                                  self.parser.location)
+
+        self.writer.text(caption)
+
+        if macro is not None:
+            self.call_text_method(macro, "finish_text",
+                                  [self.writer], {},
+                                  self.parser.location)
+
+    def beginTableRow(self):
+        self.writer.start_line()
+        self._table_cells = 0
+
+    def endTableRow(self): pass
+
+    def beginTableCell(self, header:bool, macro, args, kw):
+        if self._table_cells > 0:
+            self.writer.separator("|")
+        self._table_cells += 1
+
+        self._table_macro = macro
+        if macro is not None:
+            self.call_text_method(macro, "add_text",
+                                  [self.writer,] + args, kw,
+                                  self.parser.location)
+
+    def endTableCell(self):
+        if self._table_macro is not None:
+            self.call_text_method(self._table_macro, "finish_text",
+                                  [self.writer], {},
+                                  self.parser.location)
+            self._table_macro = None
+
+    def beginDefinitionList(self): self.writer.start_block()
+    def endDefinitionList(self): self.writer.start_block()
+    def beginDefinitionTerm(self): self.writer.start_line()
+    def endDefinitionTerm(self): pass
+
+    def beginDefinitionDef(self):
+        self.writer.push_indentation("  ")
+        self.writer.start_line()
+
+    def endDefinitionDef(self):
+        self.writer.pop_indentation()
+
+    def beginRawHTML(self): pass
+    def endRawHTML(self): pass
+    def beginNoWiki(self): pass
+    def endNoWiki(self): pass
+    def beginInlineBlock(self, classname): pass
+    def endInlineBlock(self): pass
+
+    # standalone tokens
+    def separator(self):
+        self.writer.start_block()
+        self.writer.text("----")
+        self.writer.start_block()
+
+    def close_paragraph(self):
+        self.writer.start_block()
+
+    def linebreak(self):
+        self.writer.start_line()
+
+    def call_macro(self, environment, macro_class, args, kw, location):
+        try:
+            macro = macro_class(self.context, environment)
+        except UnsuitableMacro as exc:
+            exc.location = location
+            raise
+
+        if environment == "block":
+            self.writer.start_block()
+
+        self.call_text_method(macro, "add_text",
+                              [ self.writer, ] + args, kw,
+                              location=location)
+
+        if environment == "block":
+            self.writer.start_block()
+
+    def startStartTagMacro(self, macro_class, args, kw):
+        macro = macro_class(self.context, "inline")
+        self.call_text_method(macro, "add_text",
+                              [ self.writer, ] + list(args), kw,
+                              location=self.parser.location)
+
+    def endStartTagMacro(self, macro_class):
+        macro = macro_class(self.context, "inline")
+        self.call_text_method(macro, "finish_text",
+                              [self.writer], {},
+                              location=self.parser.location)
+
+class InlineTextCompiler(TextCompiler):
+    """
+    Used for the parameters of inline macros: their text continues the
+    surrounding line.
+    """
+    def beginParagraph(self): pass
+
+    def call_macro(self, what, macro, args, kw, location):
+        if what == "block":
+            what = "inline"
+        return super().call_macro(what, macro, args, kw, location)
+
+def to_text(wikkly, context:Context=None, budget:RenderBudget=None,
+            stats:RenderStats=None, trace:RenderTrace=None):
+    if budget is None and stats is None and trace is None:
+        return Pipeline.render(TextCompiler, context, wikkly)
+
+    outfile = io.StringIO()
+    parser = WikklyParser(budget)
+    compiler = TextCompiler(context, outfile, stats=stats, trace=trace)
+    compiler.compile(parser, wikkly)
+    return outfile.getvalue()
+
+def cmdline_main(context:Context=None):
+    from .cmdline import TextCmdlineTool
+
+    cmdline_tool = TextCmdlineTool(context)
+    cmdline_tool()
+
+if __name__ == "__main__":
+    cmdline_main()
@@ -13,18 +13,31 @@ but WITHOUT ANY WARRANTY; without even the implied warranty of
 MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
 """
-from tinymarkup.exceptions import UnsuitableMacro
+import sys, re
+from html import unescape as html_unescape
+
+from tinymarkup.exceptions import MarkupError, UnsuitableMacro
 from tinymarkup.writer import TSearchWriter
 from tinymarkup.context import Context
 
 from .parser import WikklyParser
 from .compiler import WikklyCompiler
-from .to_html import CmdlineTool
+from .stats import RenderStats
+from .trace import RenderTrace
+from .writer import TSearchCopyWriter
+from .utils import html_tag_re, find_files
+from . import lextokens
+
+verbatim_word_re = re.compile(lextokens.t_WORD)
 
 class TSearchCompiler(WikklyCompiler):
-    def __init__(self, context, output):
+    def __init__(self, context, output, stats:RenderStats=None,
+                 trace:RenderTrace=None):
         WikklyCompiler.__init__(self, context)
         self.writer = TSearchWriter(output, self.context.root_language)
+        self.stats = stats
+        self.trace = trace
+        self.nested = False
 
     # characters() and end_document() are implemented by
     # TSearchCompiler_mixin. No need to repeat them here.
@@ -35,8 +48,20 @@ class TSearchCompiler(WikklyCompiler):
     def other_characters(self, s:str):
         pass
 
+    def verbatim(self, s:str):
+        # Index the words in code as the lexer would have found them.
+        for word in verbatim_word_re.findall(s):
+            self.writer.word(word)
+
+    def raw_html(self, html:str):
+        self.verbatim(html_unescape(html_tag_re.sub(" ", html)))
+
     def endDocument(self):
-        self.writer.finish_tsearch()
+        # A compiler for a macro’s WikklySource parameter writes to the
+        # calling compiler’s writer, which finishes when its document
+        # does.
+        if not self.nested:
+            self.writer.finish_tsearch()
     end_document = endDocument
 
     def beginParagraph(self): pass
@@ -155,6 +180,10 @@ class TSearchCompiler(WikklyCompiler):
     def endDefinitionTerm(self): pass
     def beginDefinitionDef(self): pass
     def endDefinitionDef(self): pass
+    def beginRawHTML(self): pass
+    def endRawHTML(self): pass
+    def beginNoWiki(self): pass
+    def endNoWiki(self): pass
     def beginInlineBlock(self, classname): pass
     def endInlineBlock(self): pass
 
@@ -189,19 +218,96 @@ class TSearchCompiler(WikklyCompiler):
                                 [self.writer], {},
                                 location=self.parser.location )
 
-
-class CmdlineTool(CmdlineTool):
-    def to_tsearch(self, outfile, source):
-        parser = WikklyParser()
-        compiler = TSearchCompiler(self.context, outfile)
-        compiler.compile(parser, source)
-
-    to_html = to_tsearch
-    def begin_html(self): pass
-    def end_html(self): pass
+def to_tsearch_copy(documents, outfile, context:Context=None,
+                    errors:dict=None):
+    """
+    Write the searchable text of `documents`, an iterable of (id,
+    source,) pairs, to `outfile` for PostgreSQL’s COPY … FROM. See
+    TSearchCopyWriter for the format. All documents are compiled by the
+    same parser and compiler. Return the number of documents written.
+
+    If `errors` is a dict, a MarkupError raised by a document is stored
+    in it with the document’s id as key, the document is left out and
+    the others go on. Otherwise the error is raised.
+    """
+    parser = WikklyParser()
+    compiler = None
+    count = 0
+    for id, source in documents:
+        if compiler is None:
+            compiler = TSearchCompiler(context, None)
+            compiler.writer = TSearchCopyWriter(
+                outfile, compiler.context.root_language)
+
+        compiler.writer.begin_document(id)
+        try:
+            compiler.compile(parser, source)
+        except MarkupError as exc:
+            if errors is None:
+                raise
+
+            # The compiler may be in any state. The writer has not
+            # written any of the document’s rows.
+            errors[id] = exc
+            compiler = None
+            parser = WikklyParser()
+        else:
+            count += 1
+
+    return count
+
+def read_files(paths, pattern:str="*.wikkly"):
+    """
+    Yield (path, source,) pairs for the files in `paths`, searching
+    directories for files that match `pattern`.
+    """
+    for path in find_files(paths, pattern):
+        yield str(path), path.read_text()
+
+def copy_cmdline_main(context:Context=None):
+    # Not imported at the top, so importing this module for the
+    # compiler stays cheap.
+    import pathlib, argparse
+    from tinymarkup.macro import MacroLibrary
+
+    if context is None:
+        context = Context(MacroLibrary())
+
+    parser = argparse.ArgumentParser(
+        description="Write the searchable text of Wikkly files for "
+        "PostgreSQL’s COPY … FROM, one row per file and language: path, "
+        "tsearch configuration and the text of weights A, B, C and D.")
+    parser.add_argument("paths", type=pathlib.Path, nargs="+",
+                        help="Files or directories to search for files.")
+    parser.add_argument("--pattern", default="*.wikkly",
+                        help="Pattern of files to use in directories.")
+    parser.add_argument("--outfile", "-o", type=argparse.FileType("w"),
+                        default=sys.stdout)
+    args = parser.parse_args()
+
+    errors = {}
+    to_tsearch_copy(read_files(args.paths, args.pattern), args.outfile,
+                    context, errors)
+
+    for path, exc in errors.items():
+        print("%s: %s: %s" % ( path, type(exc).__name__, exc, ),
+              file=sys.stderr)
+
+    if errors:
+        sys.exit(1)
+
+def __getattr__(name):
+    # See wikklytext.to_html.__getattr__().
+    if name == "CmdlineTool":
+        from .cmdline import TSearchCmdlineTool
+        return TSearchCmdlineTool
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def cmdline_main(context:Context=None):
-    cmdline_tool = CmdlineTool(context)
+    from .cmdline import TSearchCmdlineTool
+
+    cmdline_tool = TSearchCmdlineTool(context)
     cmdline_tool()
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import time, threading, json, contextlib
+
+from .monitor import ActiveMonitor
+from .stats import macro_method_name
+
+def active_trace():
+    """
+    Return the trace of the render currently running in this thread.
+    """
+    return RenderTrace.active()
+
+# Constructs whose begin…()/end…() calls on the root level of a render
+# are recorded as “block” spans.
+block_constructs = { "Paragraph", "List", "Heading", "Blockquote",
+                     "Table", "DefinitionList", "CodeBlock", "LineIndent",
+                     "RawHTML", "NoWiki", }
+
+class RenderTrace(ActiveMonitor):
+    """
+    Record nested spans with timestamps while rendering and export them
+    in Chrome’s trace event format, to be opened in chrome://tracing,
+    Perfetto or speedscope. Pass an instance to to_html(),
+    to_inline_html(), HTMLCompiler or TSearchCompiler.
+
+    Spans are recorded for
+
+    document -- each top-level render
+    render -- each nested render of a WikklySource parameter
+    block -- each block-level construct of a render (paragraph,
+       list, table …)
+    macro -- each call of a macro method
+
+    Spans of consecutive renders are appended until reset() is called.
+    """
+    slot = "trace"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self._origin = time.perf_counter()
+        self._spans = [] # (name, category, start, args,)
+        self._renders = [] # Length of self._spans when a render started.
+
+    def now(self):
+        # Trace event timestamps are in microseconds.
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def begin(self, name:str, category:str, **args):
+        self._spans.append( (name, category, self.now(), args,) )
+
+    def end(self):
+        name, category, start, args = self._spans.pop()
+        event = { "name": name,
+                  "cat": category,
+                  "ph": "X",
+                  "ts": start,
+                  "dur": self.now() - start,
+                  "pid": 1,
+                  "tid": threading.get_ident(), }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name:str, category:str, **args):
+        self.begin(name, category, **args)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def enter(self, parser, compiler):
+        """
+        Called by WikklyParser.parse() when a (possibly nested) render
+        starts.
+        """
+        if not self._renders:
+            self.activate()
+            self.begin("document", "document",
+                       compiler=type(compiler).__name__)
+        else:
+            self.begin("render", "render", depth=len(self._renders))
+
+        self._renders.append(len(self._spans) - 1)
+
+    def leave(self, parser, compiler):
+        # Close the render’s span and those left open by an exception
+        # or by a compiler that closed constructs by itself.
+        depth = self._renders.pop()
+        while len(self._spans) > depth:
+            self.end()
+
+        if not self._renders:
+            self.deactivate()
+
+    def traced_compiler(self, compiler):
+        return TracingCompiler(compiler, self)
+
+    def call_macro(self, method, call):
+        """
+        Called by WikklyCompiler.call_macro_method() to record the
+        call of a macro method. `call` is called without parameters
+        to make it.
+        """
+        with self.span(macro_method_name(method), "macro"):
+            return call()
+
+    def as_dict(self):
+        return { "traceEvents": list(self.events),
+                 "displayTimeUnit": "ms", }
+
+    def write(self, fp):
+        json.dump(self.as_dict(), fp)
+
+class TracingCompiler(object):
+    """
+    Stand in for a compiler in WikklyParser and open a “block” span when
+    a block-level construct begins on the root level of the render and
+    close it when that construct ends.
+    """
+    def __init__(self, compiler, trace:RenderTrace):
+        self._compiler = compiler
+        self._trace = trace
+        self._block = None # [ construct, nesting, ]
+
+    def __getattr__(self, name):
+        value = getattr(self._compiler, name)
+
+        if name.startswith("begin") and name[5:] in block_constructs:
+            construct = name[5:]
+            def traced(*args, **kw):
+                if self._block is None:
+                    self._trace.begin(construct, "block")
+                    self._block = [ construct, 1, ]
+                elif self._block[0] == construct:
+                    self._block[1] += 1
+                return value(*args, **kw)
+        elif name.startswith("end") and name[3:] in block_constructs:
+            construct = name[3:]
+            def traced(*args, **kw):
+                ret = value(*args, **kw)
+                if self._block is not None and self._block[0] == construct:
+                    self._block[1] -= 1
+                    if self._block[1] == 0:
+                        self._trace.end()
+                        self._block = None
+                return ret
+        else:
+            return value
+
+        setattr(self, name, traced)
+        return traced
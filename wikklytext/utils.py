@@ -0,0 +1,36 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+import re
+
+# Helpers shared by the backends and command line tools.
+
+html_tag_re = re.compile(r"<[^>]*>")
+
+def find_files(paths, pattern:str="*.wikkly"):
+    """
+    Yield the files in `paths` as pathlib.Path objects, searching
+    directories for files that match `pattern`.
+    """
+    # Not imported at the top, so importing a backend stays cheap.
+    import pathlib
+
+    for path in paths:
+        path = pathlib.Path(path)
+        if path.is_dir():
+            yield from sorted(path.rglob(pattern))
+        else:
+            yield path
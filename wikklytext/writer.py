@@ -0,0 +1,214 @@
+"""
+Copyright (C) 2023 Diedrich Vorberg
+
+Contact: diedrich@tux4web.de
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+"""
+
+from tinymarkup.writer import Writer, TSearchWriter
+
+class TextWriter(Writer):
+    """
+    Write plain text. Whitespace between texts becomes a single space.
+    Blocks are separated by blank lines, list items and the like start
+    lines of their own. Lines are indented by the current indentation,
+    the first line of a block may carry a prefix as the “- ” of a list
+    item.
+
+    Line breaks are only written when the next text arrives, so there
+    is no whitespace at the beginning or end of the output. The text
+    is collected in a list and written to the output by finish().
+    """
+    def __init__(self, output, root_language=None):
+        super().__init__(output, root_language)
+        self.indentation = ""
+        self._indentations = []
+        self._parts = []
+
+        # What goes before the next text: None for nothing, " ", "\n"
+        # or "\n\n", or "" before the first text, which only gets the
+        # indentation and prefix.
+        self._pending = ""
+        self._prefix = ""
+
+    def text(self, s:str):
+        """
+        Write `s`. Text that consists of whitespace only is turned into
+        a single space between the texts around it.
+        """
+        if s == " " or s.isspace():
+            if self._pending is None:
+                self._pending = " "
+        elif s:
+            if self._pending is not None:
+                self._flush()
+            self._parts.append(s)
+
+    def separator(self, s:str):
+        """
+        Write `s` between the texts around it with a single space on
+        either side.
+        """
+        if self._pending == " ":
+            self._pending = None
+        elif self._pending is not None:
+            self._flush()
+        self._parts.append(" " + s)
+        self._pending = " "
+
+    def verbatim(self, s:str):
+        """
+        Write `s` keeping its lines as they are.
+        """
+        if not s:
+            return
+
+        for a, line in enumerate(s.split("\n")):
+            if a > 0:
+                self.start_line()
+            if self._pending is not None:
+                self._flush()
+            self._parts.append(line)
+
+    def _flush(self):
+        pending = self._pending
+        self._pending = None
+        if pending == " ":
+            self._parts.append(" ")
+        else:
+            self._parts.append(pending + self.indentation + self._prefix)
+            self._prefix = ""
+
+    def start_line(self, prefix:str=""):
+        """
+        Start a new line before the next text and put `prefix` at its
+        beginning.
+        """
+        if self._pending == "" or self._pending == "\n\n":
+            pass
+        else:
+            self._pending = "\n"
+        self._prefix = prefix
+
+    def start_block(self):
+        """
+        Put a blank line before the next text.
+        """
+        if self._pending != "":
+            self._pending = "\n\n"
+        self._prefix = ""
+
+    def push_indentation(self, indentation:str):
+        self._indentations.append(self.indentation)
+        self.indentation += indentation
+
+    def pop_indentation(self):
+        self.indentation = self._indentations.pop()
+
+    def finish(self):
+        """
+        Write the text collected so far to the output.
+        """
+        self.output.write("".join(self._parts))
+        self._parts = []
+
+# Characters that need escaping in PostgreSQL’s COPY text format.
+copy_escapes = str.maketrans({ "\\": "\\\\", "\t": "\\t",
+                               "\n": "\\n", "\r": "\\r", })
+
+class TSearchCopyWriter(TSearchWriter):
+    """
+    Write the searchable text of many documents as one stream for
+    PostgreSQL’s COPY … FROM in text format. Each document yields one
+    row per language it contains:
+
+        id, tsearch configuration, A text, B text, C text, D text
+
+    The columns hold the document’s words of that weight and language,
+    separated by spaces. Load them into a staging table like
+
+        CREATE TEMP TABLE tsearch_staging (
+            id text, configuration regconfig,
+            a text, b text, c text, d text );
+
+    and make the tsvectors in one statement:
+
+        SELECT id, setweight(to_tsvector(configuration, a), 'A') ||
+                   setweight(to_tsvector(configuration, b), 'B') || …
+          FROM tsearch_staging;
+    """
+    weight_columns = "ABCD"
+
+    def __init__(self, output, root_language):
+        super().__init__(output, root_language)
+        self.begin_document(None)
+
+    def begin_document(self, id):
+        """
+        Start collecting the words of the document identified by `id`.
+        """
+        self.document_id = id
+
+        # Lists of words by tsearch configuration and weight.
+        self._texts = {}
+        self._weights = [ "D", ]
+        self._languages = [ self.root_language, ]
+        self._update_current()
+
+    def _update_current(self):
+        configuration = self._languages[-1].tsearch_configuration
+        texts = self._texts.get(configuration)
+        if texts is None:
+            texts = { weight: [] for weight in self.weight_columns }
+            self._texts[configuration] = texts
+        self._current = texts[self._weights[-1]]
+
+    def word(self, s:str):
+        self._current.append(s)
+
+    def push_weight(self, weight:str):
+        self._weights.append(weight)
+        self._update_current()
+
+    def pop_weight(self):
+        self._weights.pop()
+        self._update_current()
+
+    def push_language(self, language):
+        self._languages.append(language)
+        self._update_current()
+
+    def pop_language(self):
+        self._languages.pop()
+        self._update_current()
+
+    def reset_to_root_language(self):
+        self._languages = [ self.root_language, ]
+        self._update_current()
+
+    def tsvector_break(self):
+        pass
+
+    def finish_tsearch(self):
+        """
+        Write the current document’s rows. Languages without words are
+        left out.
+        """
+        id = str(self.document_id).translate(copy_escapes)
+        for configuration, texts in self._texts.items():
+            columns = [ " ".join(texts[weight]).translate(copy_escapes)
+                        for weight in self.weight_columns ]
+            if any(columns):
+                self.output.write("\t".join([ id, configuration, ]
+                                            + columns) + "\n")
+
+        self.begin_document(None)